@@ -60,3 +60,32 @@ def clearBit(array_name, bit_num):
   array_name[record] &= mask
   return(array_name[record])
 
+
+# getBits() returns the 'length' bits starting at 'bit_num' as an integer, the first bit being the most significant.
+def getBits(array_name, bit_num, length):
+  value = 0
+  for bit in range(bit_num, bit_num + length):
+      value = (value << 1) | testBit(array_name, bit)
+  return(value)
+
+# setBits() stores 'value' into the 'length' bits starting at 'bit_num', the first bit being the most significant.
+def setBits(array_name, bit_num, length, value):
+  for bit in range(bit_num + length - 1, bit_num - 1, -1):
+      if (value & 1):
+          setBit(array_name, bit)
+      else:
+          clearBit(array_name, bit)
+      value = value >> 1
+  return(array_name)
+
+# changedWords() returns, in order, the words of 'wordSize' bits that differ between two bit arrays of the same size.
+def changedWords(old_array, new_array, wordSize, words):
+  if (old_array == new_array):
+      return []
+  changed = set()
+  for record in range(0, len(old_array)):
+      if (old_array[record] != new_array[record]):
+          # Bit n is kept in bit n+1 of the array, so a record covers bits record*32-1 to record*32+30
+          for word in range(max(record * 32 - 1, 0) // wordSize, min((record * 32 + 30) // wordSize + 1, words)):
+              changed.add(word)
+  return sorted(changed)
@@ -0,0 +1,135 @@
+#
+# The run result cache.
+#
+# The machine is deterministic: started from the same memory and registers,
+# with the same input tape, a program always does the same thing.  So the
+# result of a run can be kept, keyed by a hash of everything that goes into
+# it, and handed back the next time instead of running the program again.
+#
+# The cache holds recent results in memory, dropping the least recently used
+# when it is full, and can also keep them on disk, one JSON file per result,
+# so that they outlive the process.
+#
+# A cached result carries the final memory and registers as well as the
+# output and step count, so a cache hit leaves the machine exactly as a real
+# run would have.  The key also holds the version of the engine and the
+# timing model, so results kept on disk are not reused once the orders or
+# their costs change.
+#
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from engine import run
+from engine import getAccValue
+from engine import engineVersion
+from engine import stateArrays
+
+class ResultCache():
+   def __init__(self, capacity=256, directory=None):
+      self.capacity = capacity
+      # Where results are kept on disk, or None to keep them in memory only
+      self.directory = directory
+      if (directory is not None):
+         os.makedirs(directory, exist_ok=True)
+      self.results = OrderedDict()
+      self.hits = 0
+      self.misses = 0
+
+   # This returns the key for a run of the machine as it stands, with the given input tape
+   def key(self, object, inputTape=b'', maxSteps=None):
+      hash = hashlib.sha256()
+      for name in stateArrays:
+         hash.update(getattr(object, name).tobytes())
+      hash.update(("%d %r %r:" % (object.programCounter, maxSteps, object.geometry)).encode())
+      hash.update(("%d %r:" % (engineVersion, sorted(object.timing.orderTimes.items()))).encode())
+      hash.update(bytes(inputTape))
+      return hash.hexdigest()
+
+   def path(self, key):
+      return os.path.join(self.directory, key + ".json")
+
+   # This returns the result stored for a key, or None
+   def get(self, key):
+      if (key in self.results):
+         self.results.move_to_end(key)
+         return self.results[key]
+      if (self.directory is not None):
+         try:
+            with open(self.path(key), "r") as file:
+               result = json.load(file)
+         except (IOError, ValueError):
+            return None
+         self.remember(key, result)
+         return result
+      return None
+
+   def put(self, key, result):
+      self.remember(key, result)
+      if (self.directory is not None):
+         # Written to the side and renamed, so a reader never sees half a file
+         temporary = self.path(key) + ".%d.tmp" % os.getpid()
+         with open(temporary, "w") as file:
+            json.dump(result, file)
+         os.replace(temporary, self.path(key))
+
+   def remember(self, key, result):
+      self.results[key] = result
+      self.results.move_to_end(key)
+      while (len(self.results) > self.capacity):
+         self.results.popitem(last=False)
+
+   def clear(self):
+      self.results.clear()
+
+# This captures the state a run leaves the machine in
+def machine_state(object):
+   state = {}
+   for name in stateArrays:
+      state[name] = getattr(object, name).tobytes().hex()
+   state['programCounter'] = object.programCounter
+   state['executing'] = object.executing
+   state['resetRequested'] = object.resetRequested
+   return state
+
+# This puts the machine into a captured state
+def restore_state(object, state):
+   for name in stateArrays:
+      array = getattr(object, name)
+      values = type(array)(array.typecode, bytes.fromhex(state[name]))
+      if (name == 'memory'):
+         # So that the store listeners, the decoded table among them, hear of the words that changed
+         object.restore_memory(values)
+      else:
+         array[:] = values
+   object.programCounter = state['programCounter']
+   object.executing = state['executing']
+   object.resetRequested = state['resetRequested']
+
+# This runs the loaded program like engine.run(), unless the cache already
+# holds the result of the same run, in which case the machine is put straight
+# into the state the run ends in.  The result says whether it came from the cache.
+def run_cached(object, cache, inputTape=b'', maxSteps=None):
+   if (object.stepMode == True):
+      maxSteps = 1
+   key = cache.key(object, inputTape, maxSteps)
+   result = cache.get(key)
+   if (result is not None):
+      cache.hits += 1
+      restore_state(object, result['state'])
+      object.output.extend(result['output'])
+      object.simulatedTime += result['simulatedTime']
+      if (object.verbose):
+         for ch in result['output']:
+            print(ch)
+      result = dict(result)
+      result['cached'] = True
+      return result
+   cache.misses += 1
+   result = run(object, maxSteps)
+   result['accumulator'] = getAccValue(object)
+   result['state'] = machine_state(object)
+   cache.put(key, result)
+   result = dict(result)
+   result['cached'] = False
+   return result
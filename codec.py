@@ -0,0 +1,209 @@
+#
+# The 5 bit teleprinter code.
+#
+#  The following character codes are used
+#  This is prior to ASCII or UNICODE being defined, so they defined their own charcater coding.
+#
+# Every table here is built once, when the module is imported.  Whole tapes are
+# converted with bytes.translate(), one table lookup per character done in C,
+# rather than a character at a time through dictionaries.
+#
+# There are two ways of writing a tape as text:
+#
+#   symbols     - one character per code, as program tapes are written in the
+#                 .asm files: the letters, digits for the figures 0 to 9, and
+#                 * ! & for the erase, phi and delta codes.
+#   teleprinter - what the teleprinter prints.  The same code prints a letter
+#                 or a figure depending on the shift it is in, which is changed
+#                 by the figure shift and letter shift codes; those, and blank
+#                 tape, print nothing.
+#
+import re
+
+characterCodes = {
+         'P':'00000',
+         'Q':'00001',
+         'W':'00010',
+         'E':'00011',
+         'R':'00100',
+         'T':'00101',
+         'Y':'00110',
+         'U':'00111',
+         'I':'01000',
+         'O':'01001',
+         'J':'01010',
+         'Pi':'01011',
+         'S':'01100',
+         'Z':'01101',
+         'K':'01110',
+         'Erase(1)':'01111',
+         'BT(2)':'10000',
+         'F':'10001',
+         'Theta':'10010',
+         'D':'10011',
+         'Phi':'10100',
+         'H':'10101',
+         'N':'10110',
+         'M':'10111',
+         'Delta':'11000',
+         'L':'11001',
+         'X':'11010',
+         'G':'11011',
+         'A':'11100',
+         'B':'11101',
+         'C':'11110',
+         'V':'11111' }
+
+opcodes = {
+    'A': '11100',  # Add
+    'D': '10011',  #
+    'E': '00011',  # Conditional branch
+    'G': '11011',  # Conditional branch
+    'H': '10101',  # Copy
+    'I': '01000',  # Read
+    'L': '11001',  # Shift
+    'R': '00100',  # Shift
+    'S': '01100',  # Subtract
+    'T': '00101',  # Store
+    'Z': '01101',  # Stop and ring bell
+    'O': '01001',  # Output (print)
+    'U': '00111',  # Store
+    'P': '00000',  #
+    '*': '01111',  # (erase)
+    '!': '10100',  # (phi)
+    'W': '00010',  # (phi)
+    '&': '11000',  # Delta
+    'V': '11111'}  # Multiply
+
+inv_opcodes = {}
+
+for k, v in opcodes.items():
+    inv_opcodes[v] = inv_opcodes.get(v, [])
+    inv_opcodes[v].append(k)
+
+# The symbol for each code, indexed by the code.  # is pi (figure shift), * is
+# erase (letter shift), . is blank tape, @ is theta, ! is phi and & is delta.
+symbolNames = {'Pi':'#', 'Erase(1)':'*', 'BT(2)':'.', 'Theta':'@', 'Phi':'!', 'Delta':'&'}
+symbols = [''] * 32
+for name, bits in characterCodes.items():
+    symbols[int(bits, 2)] = symbolNames.get(name, name)
+symbols = "".join(symbols)
+
+# The code of each symbol, and of the digits, which are punched in figure shift
+symbolCodes = {}
+for code in range(0, 32):
+    symbolCodes[symbols[code]] = code
+for digit in range(0, 10):
+    symbolCodes[str(digit)] = digit
+
+figureShift = 11
+letterShift = 15
+blankTape = 16
+
+# What the teleprinter prints for each code in letter shift and in figure shift.
+# theta is carriage return, phi is space and delta is line feed.
+letters = "PQWERTYUIOJ" + "_" + "SZK" + "_" + "_" + "F" + "\r" + "D" + " " + "HNM" + "\n" + "LXGABCV"
+figures = "0123456789?" + "_" + "\"+(" + "_" + "_" + "$" + "\r" + ";" + " " + "£,." + "\n" + ")/#-?:="
+
+# Characters that print the same in either shift
+bothShifts = " \r\n"
+
+# This builds a 256 byte table for bytes.translate() from a mapping of byte values
+def translation(mapping):
+   table = bytearray(range(0, 256))
+   for source, target in mapping.items():
+      table[source] = target
+   return bytes(table)
+
+symbolEncoding = translation(dict((ord(symbol), code) for symbol, code in symbolCodes.items()))
+symbolDecoding = translation(dict((code, ord(symbols[code])) for code in range(0, 32)))
+symbolCharacters = "".join(symbolCodes).encode("latin-1")
+whiteSpace = b" \t\r\n\f\v"
+
+letterDecoding = translation(dict((code, ord(letters[code])) for code in range(0, 32)))
+figureDecoding = translation(dict((code, ord(figures[code])) for code in range(0, 32)))
+# The shift codes and blank tape print nothing
+silentCodes = bytes([figureShift, letterShift, blankTape])
+
+letterEncoding = {}
+figureEncoding = {}
+for code in range(31, -1, -1):
+    if (code not in (figureShift, letterShift, blankTape)):
+        letterEncoding[ord(letters[code])] = code
+        figureEncoding[ord(figures[code])] = code
+letterEncoding = translation(letterEncoding)
+figureEncoding = translation(figureEncoding)
+
+letterOnly = "".join(sorted(set(letters) - set(figures) - set("_")))
+figureOnly = "".join(sorted(set(figures) - set(letters) - set("_")))
+shiftRuns = re.compile("([%s][%s]*)|([%s][%s]*)|([%s]+)" % (
+   re.escape(letterOnly), re.escape(letterOnly + bothShifts),
+   re.escape(figureOnly), re.escape(figureOnly + bothShifts),
+   re.escape(bothShifts)))
+shiftSplit = re.compile(b"([\x0b\x0f])")
+
+# This converts symbol text into tape codes, leaving out white space
+def encode_symbols(text):
+   try:
+      data = text.encode("latin-1")
+   except UnicodeEncodeError as e:
+      raise ValueError("Character %r can not be punched on a tape" % text[e.start])
+   data = data.translate(None, whiteSpace)
+   invalid = data.translate(None, symbolCharacters)
+   if (invalid):
+      raise ValueError("Character %r can not be punched on a tape" % chr(invalid[0]))
+   return data.translate(symbolEncoding)
+
+# This converts tape codes into symbol text
+def decode_symbols(codes):
+   codes = bytes(codes)
+   if (codes.translate(None, bytes(range(0, 32)))):
+      raise ValueError("Tape codes are 5 bits")
+   return codes.translate(symbolDecoding).decode("latin-1")
+
+# This converts what the teleprinter printed back into tape codes, adding
+# shift codes where the shift changes.  It returns the codes and the shift
+# the teleprinter is left in, which is "letters" or "figures".
+def encode_text(text, shift="letters"):
+   output = bytearray()
+   position = 0
+   for match in shiftRuns.finditer(text):
+      if (match.start() != position):
+         raise ValueError("Character %r can not be printed by the teleprinter" % text[position])
+      letterRun, figureRun, eitherRun = match.groups()
+      if (letterRun is not None):
+         if (shift != "letters"):
+            output.append(letterShift)
+            shift = "letters"
+         output += letterRun.encode("latin-1").translate(letterEncoding)
+      elif (figureRun is not None):
+         if (shift != "figures"):
+            output.append(figureShift)
+            shift = "figures"
+         output += figureRun.encode("latin-1").translate(figureEncoding)
+      else:
+         output += eitherRun.encode("latin-1").translate(letterEncoding)
+      position = match.end()
+   if (position != len(text)):
+      raise ValueError("Character %r can not be printed by the teleprinter" % text[position])
+   return bytes(output), shift
+
+# This converts tape codes into what the teleprinter prints, following the
+# shift codes.  It returns the text and the shift the teleprinter is left in.
+def decode_text(codes, shift="letters"):
+   codes = bytes(codes)
+   if (codes.translate(None, bytes(range(0, 32)))):
+      raise ValueError("Tape codes are 5 bits")
+   pieces = []
+   for piece in shiftSplit.split(codes):
+      if (piece == b"\x0b"):
+         shift = "figures"
+      elif (piece == b"\x0f"):
+         shift = "letters"
+      elif (piece):
+         piece = piece.translate(None, silentCodes)
+         if (shift == "letters"):
+            pieces.append(piece.translate(letterDecoding))
+         else:
+            pieces.append(piece.translate(figureDecoding))
+   return b"".join(pieces).decode("latin-1"), shift
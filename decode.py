@@ -0,0 +1,68 @@
+#
+# The decoded program table.
+#
+# The CLI needs the opcode, address and operand type of each order as it
+# executes.  Rather than a dictionary per field, the table keeps one fixed
+# length array per field, indexed by word address, so a machine carries a few
+# kilobytes for its whole store and a lookup is a plain index.
+#
+# The table is only ever filled in from memory, so it can never hold anything
+# memory does not.  Where the fields of each word are comes from the machine's
+# geometry.  The machine tells the table of every store to memory, see
+# EDSAC.store_bits(), and the table decodes the words stored to again.
+#
+import array
+from bitutils import getBits
+from bitutils import testBit
+
+class DecodeTable():
+   __slots__ = ('geometry', 'words', 'opcode', 'hasAddress', 'address', 'operandType', 'loaded')
+
+   def __init__(self, geometry):
+      self.geometry = geometry
+      words = geometry.words
+      self.words = words
+      # The 5 bit opcode of each word
+      self.opcode = array.array('B', bytes(words))
+      # 1 when the address of the order is not 0, for listings only: the engine
+      # takes an order with no address, such as AF, as one on word 0
+      self.hasAddress = array.array('B', bytes(words))
+      # The address each order works on.  In a store smaller than the address
+      # field can reach, addresses wrap round the store as they did on the
+      # machine, so an order can never reach past its end.
+      self.address = array.array('H', bytes(2 * words))
+      # 0 for a short (F) operand, 1 for a long (D) operand
+      self.operandType = array.array('B', bytes(words))
+      # 1 for the words loaded from the program tape
+      self.loaded = array.array('B', bytes(words))
+
+   # This decodes one word of memory into the table
+   def refresh(self, memory, address):
+      geometry = self.geometry
+      self.opcode[address] = getBits(memory, geometry.opcodeStart[address], geometry.opcodeBits)
+      orderAddress = getBits(memory, geometry.addressStart[address], geometry.addressBits)
+      self.address[address] = orderAddress % self.words
+      self.hasAddress[address] = (orderAddress != 0)
+      self.operandType[address] = testBit(memory, geometry.lengthStart[address])
+
+   # This is the machine's store listener, decoding again the words stored to
+   def stored(self, object, start, end, old, new):
+      for address in range(start, end):
+         self.refresh(object.memory, address)
+
+   # This marks the words loaded from a tape, from startWord up to but not including endWord
+   def markLoaded(self, startWord, endWord):
+      for address in range(0, self.words):
+         self.loaded[address] = 0
+      for address in range(startWord, endWord):
+         self.loaded[address] = 1
+
+   # This decodes the words loaded from a tape, from startWord up to but not including endWord
+   def load(self, memory, startWord, endWord):
+      self.markLoaded(startWord, endWord)
+      for address in range(startWord, endWord):
+         self.refresh(memory, address)
+
+   # This returns the addresses of the words loaded from the tape, in order
+   def loadedAddresses(self):
+      return [address for address in range(0, self.words) if self.loaded[address]]
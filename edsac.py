@@ -13,14 +13,39 @@
 #
 
 from time import localtime
+import argparse
 import os
 import sys
 import array
 from bitutils import makeBitArray
-from bitutils import testBit
 from bitutils import setBit
 from bitutils import clearBit
+from bitutils import getBits
+from bitutils import setBits
+from bitutils import changedWords
 from tape import load_initial_orders
+from tape import boot_tape
+from tape import reload_tape
+from tape import note_tape_write
+from codec import symbols
+from decode import DecodeTable
+from geometry import standardGeometry
+from engine import run
+from engine import note_last_write
+from codec import inv_opcodes
+from profiler import Profiler
+from timing import TimingModel
+from timing import Pacer
+from timing import format_time
+from tracefile import TraceWriter
+from cache import ResultCache
+from cache import run_cached
+from render import defaultViews
+from render import check_views
+from render import render_register
+from render import render_registers
+from render import render_memory
+from render import render_step
 
 # Global Variables
 version="0.1"
@@ -81,38 +106,73 @@ version="0.1"
 #     Z   -  Stop the machine and ring the warning bell
 
 class EDSAC():
-   def __init__(self, name):
+   def __init__(self, name, verbose=True, geometry=None):
      self.name = name
-     print("Creating new EDSAC machine with name", name,"\n")
+     # When verbose is off the machine does not chatter, used when it is driven from code
+     self.verbose = verbose
+     if (self.verbose):
+        print("Creating new EDSAC machine with name", name,"\n")
      # This is only used to paginate during memory dumps
      self.pageSize = 24
 
-     # define the memory of the machine
-     #self.words = 512
-     #self.wordSize = 35
-     self.words = 1024
-     self.wordOpcode = {}
-     self.wordHasAddress = {}
-     self.wordAddress = {}
-     self.wordOperandType = {}
-     self.wordSize = 17
-     self.bits = self.words * self.wordSize + 1
+     # define the memory of the machine, 1024 words of 17 bits unless given
+     # another geometry, e.g. Geometry(512, 35, lengthField=(34, 1))
+     if (geometry is None):
+        geometry = standardGeometry
+     self.geometry = geometry
+     self.words = geometry.words
+     self.wordSize = geometry.wordSize
+     self.bits = geometry.bits
      self.memory = makeBitArray(self.bits,0)
+     # The functions told of every store to memory, see store_bits()
+     self.storeListeners = []
+     # The opcode, address and operand type of each word, kept in step with memory
+     self.decoded = DecodeTable(geometry)
+     self.add_store_listener(self.decoded.stored)
      self.programLoaded = False
      self.programCounter = 31
      self.executing = False
      self.stepMode = False
      self.debugMode = False
+     # Set by the machine when it wants the operator to press reset
+     self.resetRequested = False
+     # The characters printed by O orders
+     self.output = []
+     # A profiler.Profiler counting the orders executed, or None when not profiling
+     self.profiler = None
+     # The time the program would have taken on the real machine, in microseconds
+     self.timing = TimingModel()
+     self.simulatedTime = 0
+     # A timing.Pacer holding execution to the speed of the real machine, or None to run flat out
+     self.pacer = None
+     # A tracefile.TraceWriter recording every order executed, or None when not recording
+     self.recorder = None
+     # A cache.ResultCache of earlier runs to reuse, or None to always run
+     self.resultCache = None
+     # The word written by the last order executed, if it wrote one
+     self.lastWrite = None
+     self.add_store_listener(note_last_write)
+     # The tape loaded last, its file, its lines and the orders on them, where
+     # loading stopped and the words written since, used by reload (tape.reload_tape)
+     self.tapeFile = None
+     self.tapeSource = None
+     self.tapeOrders = None
+     self.tapeEnd = None
+     self.tapeWritten = None
+     self.add_store_listener(note_tape_write)
+     # Tapes are booted by really running the initial orders ("faithful") or by
+     # applying the memory image they produce ("accelerated"), see tape.py
+     self.bootMode = "accelerated"
 
      # The Control and ALU (together make the CPU complex contain the following 5 registers)
      # Sequence Control Register, Order Tank, Accumulator, Multiplier, and Multiplicand
 
      # define the Order Tank
-     self.otSize = 17
+     self.otSize = self.wordSize
      self.ot = makeBitArray(self.otSize+1,0)
 
      # define the Sequence Control Register
-     self.scrSize = 10
+     self.scrSize = geometry.addressBits
      self.scr = makeBitArray(self.scrSize+1,0)
 
      # define the accumulator
@@ -132,16 +192,110 @@ class EDSAC():
      # This function loads exactly those initial orders as they were hardwired into memory locations 0 to 30, execution starts @ location 31
      load_initial_orders(self)
 
+   # Memory access.  Every store to memory goes through store_bits(), so
+   # whatever needs to know of stores can register a listener here rather
+   # than wrap each order that writes.  A listener is called as
+   #
+   #   listener(machine, start, end, old, new)
+   #
+   # for the words from start up to but not including end, with old and new
+   # their contents before and after the store, run together with the word at
+   # start the most significant.
+   def add_store_listener(self, listener):
+     self.storeListeners.append(listener)
+
+   def remove_store_listener(self, listener):
+     self.storeListeners.remove(listener)
+
+   # This reads a whole word of memory
+   def read_word(self, address):
+     return getBits(self.memory, self.geometry.wordStart[address], self.wordSize)
+
+   # This stores value in length bits of a word, starting offset bits into it
+   def store_bits(self, address, offset, length, value):
+     if (address < 0 or address >= self.words or offset < 0 or offset + length > self.wordSize):
+        raise ValueError("Bits %d to %d of word %d are not in the store" % (offset, offset + length - 1, address))
+     start = self.geometry.wordStart[address]
+     old = getBits(self.memory, start, self.wordSize)
+     setBits(self.memory, start + offset, length, value)
+     new = getBits(self.memory, start, self.wordSize)
+     for listener in self.storeListeners:
+        listener(self, address, address + 1, old, new)
+
+   # This stores a whole word of memory
+   def store_word(self, address, value):
+     self.store_bits(address, 0, self.wordSize, value)
+
+   # This replaces the whole of memory with a copy, telling the listeners of each word that changed
+   def restore_memory(self, memory):
+     old = self.memory[:]
+     self.memory[:] = memory
+     wordStart = self.geometry.wordStart
+     for address in changedWords(old, self.memory, self.wordSize, self.words):
+        oldWord = getBits(old, wordStart[address], self.wordSize)
+        newWord = getBits(self.memory, wordStart[address], self.wordSize)
+        for listener in self.storeListeners:
+           listener(self, address, address + 1, oldWord, newWord)
+
+
+# A session is where the CLI reads its commands from: the keyboard, or the
+# lines of script files.  A script gives each command its arguments inline,
+# for example "load test.asm" or "dump acc", and nothing is asked while one is
+# running: questions with no argument given get an empty answer, and the
+# screen is never cleared or paginated.  Scripts can source other scripts.
+#
+# The same session is handed on when a command starts the CLI for a new
+# machine (reset, restart, create), so a script carries on across them.
+class Session():
+   def __init__(self, exitAtEnd=False):
+      # The lines still to be run of each script being run, innermost last
+      self.scripts = []
+      # When set the CLI exits once the scripts are done, rather than going back to the keyboard
+      self.exitAtEnd = exitAtEnd
+
+   def scripted(self):
+      return (len(self.scripts) != 0)
+
+   # This starts running the commands in a script file
+   def source(self, filename):
+      with open(filename, "r") as file:
+         lines = file.readlines()
+      self.scripts.append(iter(lines))
+
+   # This returns the next command, skipping blank lines and # comments in scripts
+   def read_command(self, prompt):
+      while (self.scripts):
+         try:
+            line = next(self.scripts[-1]).strip()
+         except StopIteration:
+            self.scripts.pop()
+            continue
+         if (line == "" or line.startswith("#")):
+            continue
+         # Echoed so the output reads like an interactive session
+         print(prompt + line)
+         return line
+      if (self.exitAtEnd):
+         return "exit"
+      try:
+         return input(prompt)
+      except EOFError:
+         return "exit"
 
 # This function starts the command line interface.
 #
-def cli(object):
+def cli(object, session=None):
    # This is the command line parser, it accepts an EDSAC machine as a 
    # machine to execute commands on.
 
    prompt="("+object.name+")->"
 
-   updatedSCR = str(bin(object.programCounter)[2:].zfill(10))
+   if (session is None):
+      session = Session()
+   # The arguments given after the command being run, taken in turn by ask()
+   arguments = []
+
+   updatedSCR = str(bin(object.programCounter)[2:].zfill(object.scrSize))
 
    for bit in range(0, (object.scrSize)):
       if (updatedSCR[bit] == '1'):
@@ -152,71 +306,6 @@ def cli(object):
           # print "Setting bit", bit, "to 0"
       # scr()
 
-#  The following character codes are used
-#  This is prior to ASCII or UNICODE being defined, so they defined their own charcater coding.
-#
-   io = {
-         'P':'00000',
-         'Q':'00001',
-         'W':'00010',
-         'E':'00011',
-         'R':'00100',
-         'T':'00101',
-         'Y':'00110',
-         'U':'00111',
-         'I':'01000',
-         'O':'01001',
-         'J':'01010',
-         'Pi':'01011',
-         'S':'01100',
-         'Z':'01101',
-         'K':'01110',
-         'Erase(1)':'01111',
-         'BT(2)':'10000',
-         'F':'10001',
-         'Theta':'10010',
-         'D':'10011',
-         'Phi':'10100',
-         'H':'10101',
-         'N':'10110',
-         'M':'10111',
-         'Delta':'11000',
-         'L':'11001',
-         'X':'11010',
-         'G':'11011',
-         'A':'11100',
-         'B':'11101',
-         'C':'11110',
-         'V':'11111' }
-
-   opcodes = {
-       'A': '11100',  # Add
-       'D': '10011',  #
-       'E': '00011',  # Conditional branch
-       'G': '11011',  # Conditional branch
-       'H': '10101',  # Copy
-       'I': '01000',  # Read
-       'L': '11001',  # Shift
-       'R': '00100',  # Shift
-       'S': '01100',  # Subtract
-       'T': '00101',  # Store
-       'Z': '01101',  # Stop and ring bell
-       'O': '01001',  # Output (print)
-       'U': '00111',  # Store
-       'P': '00000',  #
-       '*': '01111',  # (erase)
-       '!': '10100',  # (phi)
-       'W': '00010',  # (phi)
-       '&': '11000',  # Delta
-       'V': '11111'}  # Multiply
-
-   inv_opcodes = {}
-
-   #for k, v in opcodes.iteritems():
-   for k, v in opcodes.items():
-       inv_opcodes[v] = inv_opcodes.get(v, [])
-       inv_opcodes[v].append(k)
-
    # TODO - Need to double check all items in menu work.
 
 # These are the commands supported by the CLI.
@@ -226,25 +315,57 @@ def cli(object):
             'clear':'This command clears the screen.',
             'restart':'This command reinitializes the current machine.',
             'reset':'This command simulates pressing the reset button on the machine.',
-            'registers':'This command displays the current register values.',
-            '(m)emory':'This command displays the current contents of memory',
+            'registers':'This command displays the current register values, in the views given (bits, decimal, fraction, order).',
+            '(m)emory':'This command displays the current contents of memory, in the views given.',
             '(s)tep':'This command enters single step mode, issue reset to leave step mode.',
             'start':'This command simulates pressing the start button on the machine.',
             'debug':'Toggle DEBUG mode for more verbose or less verbose output',
+            'bootmode':'Toggle between faithful and accelerated booting of tapes.',
+            'pace':'This command paces execution to the speed of the real machine, or a multiple of it.',
+            'record':'This command starts or stops recording a trace of the orders executed.',
+            'cache':'Toggle reuse of the results of earlier identical runs.',
+            'profile':'Toggle counting of the orders executed, by opcode and address.',
+            'profilereport':'This command lists the program with the profile counts.',
+            'profilesave':'This command saves the profile counts as CSV or JSON.',
             '(a)cc':'This command displays the accumulator.',
             'scr':'This command displays the sequence control register.',
             'ot':'This command displays the order tank register.',
             'multiplier':'This command displays the multiplier register.',
             'multiplicand':'This command displays the multiplicand register.',
             '(l)oad':'This command loads a program from paper tape (simulated in from a file).',
+            'reload':'This command loads the last tape again after editing it, storing only what changed.',
             '(d)ump':'This command dumps the entire machine state.',
             'setbit':'This command sets a bit of memory to 1.',
             'list':'This command lists the assembler code loaded.',
             'clearbit':'This command sets a bit of memory to 0.',
             '(h)elp':'This command prints this list of help.',
             'testacc': 'Set acc to all 1\'s for testing',
+            'source':'This command runs the commands in a script file.',
             '(e)xit':'This command exits the CLI.'}
 
+# This gets the answer to a question asked by a command, taking the next
+# argument given with the command when there is one.  Nothing is asked while
+# a script is running.
+#
+   def ask(question):
+      if (arguments):
+         return arguments.pop(0)
+      if (session.scripted()):
+         return ""
+      return input(question)
+
+# This waits for the operator to press enter, except in a script
+#
+   def pause(message):
+      if (not session.scripted()):
+         input(message)
+
+# This clears the screen, except in a script
+#
+   def clear_screen():
+      if (not session.scripted()):
+         os.system('clear')
+
 # This prints the menu
 #
    def print_welcome():
@@ -263,23 +384,31 @@ def cli(object):
       print("\n")
 
 
+# This finishes the trace being recorded, if any, before the machine is replaced or the simulator exits
+   def close_recorder():
+      if (object.recorder is not None):
+         object.recorder.close()
+         object.recorder = None
+
 # This resets the entire simulator
 #
    def reset():
       machineName = object.name
-      i = input("Press enter to simulate pressing reset button on machine.")
-      os.system('clear')
+      pause("Press enter to simulate pressing reset button on machine.")
+      clear_screen()
+      close_recorder()
       newMachine=EDSAC(machineName)
-      cli(newMachine)
+      cli(newMachine, session)
 
 # This restarts the simulator, creating a duplicate version of the EDSAC currently running, but reinitialized
 #
    def restart():
       machineName = object.name
-      i = input("Press enter to restart EDSAC with freshly initialized machine and current machine name...")
-      os.system('clear')
+      pause("Press enter to restart EDSAC with freshly initialized machine and current machine name...")
+      clear_screen()
+      close_recorder()
       newMachine=EDSAC(machineName)
-      cli(newMachine)
+      cli(newMachine, session)
        
 # This prints the menu/help
 #
@@ -288,88 +417,107 @@ def cli(object):
 
 # This exits the simulator
    def exit():
-      sys.exit("Goodbye!")
+      close_recorder()
+      print("Goodbye!")
+      sys.exit(0)
 
 # This sets a bit in memory, used for debugging.
    def setbit():
       print("Memory starts at location 0 and ends at location",object.bits-1)
-      bitToSet = input("Please enter the bit location to set to 1 ->")
+      bitToSet = ask("Please enter the bit location to set to 1 ->")
       if (bitToSet == ""):
          do_nothing()
          return
-      setBit(object.memory,int(bitToSet))
+      store_bit(bitToSet, 1)
 
 # This clears a bit in memory, used for debugging.
    def clearbit():
       print("Memory starts at location 0 and ends at location",object.bits-1)
-      bitToSet = input("Please enter the bit location to set to 0 ->")
+      bitToSet = ask("Please enter the bit location to set to 0 ->")
       if (bitToSet == ""):
          do_nothing()
          return
-      clearBit(object.memory,int(bitToSet))
+      store_bit(bitToSet, 0)
+
+# This stores one bit of memory, given its location counting from bit 0 of word 0
+   def store_bit(location, value):
+      try:
+         address, offset = divmod(int(location), object.wordSize)
+         object.store_bits(address, offset, 1, value)
+      except ValueError:
+         print("<ERROR>: Not a bit of memory\n")
+
+# This gets the views asked for after a display command, e.g. "acc decimal fraction",
+# or None when one is not known
+   def requested_views():
+      names = tuple(arguments) or defaultViews
+      del arguments[:]
+      try:
+         return check_views(names)
+      except ValueError as e:
+         print("<ERROR>:", e, "\n")
+         return None
+
+# This prints the contents of a register, each view rendered in one go
+   def show_register(name, description, size):
+      names = requested_views()
+      if (names is None):
+         return
+      print("Printing value of {0} (starting bit 0, ending bit {1}):".format(description, size-1))
+      print(render_register(object, name, names))
+      print("\n")
 
 # This prints the contents of the order tank
    def ot():
-      print("Printing value of order tank register (starting bit 0, ending bit 16):")
-      print("Order Tank Register:",)
-      for bit in range(0,(object.otSize)):
-          print("{0:1}".format(testBit(object.ot,bit)),)
-      print("\n")
+      show_register('ot', "order tank register", object.otSize)
 
 # This prints the contents of the multiplier
    def multiplier():
-      print("Printing value of multiplier register (starting bit 0, ending bit 34):")
-      print("Multiplier Register:",)
-      for bit in range(0,(object.multiplierSize)):
-          print("{0:1}".format(testBit(object.multiplier,bit)),)
-      print("\n")
+      show_register('multiplier', "multiplier register", object.multiplierSize)
 
 # This prints the contents of the multiplicand
    def multiplicand():
-      print("Printing value of multiplicand register (starting bit 0, ending bit 34):")
-      print("Multiplicand Register:",)
-      for bit in range(0,(object.multiplicandSize)):
-          print("{0:1}".format(testBit(object.multiplicand,bit)),)
-      print("\n")
+      show_register('multiplicand', "multiplicand register", object.multiplicandSize)
 
 # This prints the contents of the sequence control register
    def scr():
-      print("Printing value of sequence control register (starting bit 0, ending bit 9):")
-      print("Sequence Control Register:",)
-      for bit in range(0,(object.scrSize)):
-          print("{0:1}".format(testBit(object.scr,bit)),)
-      print("\n")
+      show_register('scr', "sequence control register", object.scrSize)
 
 # This prints the contents of the accumulator
    def acc():
-      print("Printing value of accumulator (starting bit 0, ending bit 70):")
-      print("Accumulator:",)
-      for bit in range(0,(object.accSize)):
-          print("{0:1}".format(testBit(object.acc,bit)),)
-      print("\n")
+      show_register('acc', "accumulator", object.accSize)
 
 # This clears the screen
    def clear():
-      os.system('clear')
+      clear_screen()
 
-# This prints the contents of the registers and memory
+# This prints the contents of the registers and memory, or of the one given
    def dump():
+       if (arguments):
+          name = arguments.pop(0)
+          if (name not in dumps):
+             print("<ERROR>: Can not dump", name, ", choose from", ", ".join(sorted(dumps)), "\n")
+             return
+          dumps[name]()
+          return
        registers()
        memory()
 
 # This prints the contents of all registers
    def registers():
-      acc()
-      scr()
-      ot()
-      multiplier()
-      multiplicand()
+      names = requested_views()
+      if (names is None):
+         return
+      print(render_registers(object, names))
+      print("Simulated time:", format_time(object.simulatedTime))
+      print("\n")
 
 # This creates an instantiantion of an EDSAC object.
    def create():
-      c2 = input("Please enter a name for your EDSAC->")
+      c2 = ask("Please enter a name for your EDSAC->")
+      close_recorder()
       newEdsac = EDSAC(c2)
-      cli(newEdsac)
+      cli(newEdsac, session)
 
 # This prints the contents of memory.
    def memory():
@@ -378,353 +526,94 @@ def cli(object):
       print("Total words in memory is ", object.words)
       print("Word size is ", object.wordSize)
       print("Total bits in memory is ", object.bits-1)
-      currentWord=0
-      for bit in range(0,(object.bits-1)):
-          if (bit != 0):
-             if (((bit+1) % object.wordSize) == 0):
-                print ("{0:1}".format(testBit(object.memory,bit)))
-                currentWord = currentWord + 1
-                # used to paginate
-                if ((currentWord % object.pageSize) == 0):
-                   i = input("Press enter to continue or \"q\" to quit -> ")
-                   if (i == 'q'):
-                      break;
-                if (currentWord != object.words):
-                   print("Word ({0})-".format(currentWord),)
-             else:
-                print("{0:1}".format(testBit(object.memory,bit)),)
-          else:
-              print("Word ({0})-".format(currentWord),)
-              print("{0:1}".format(testBit(object.memory,bit)),)
+      names = requested_views()
+      if (names is None):
+         return
+      # A page of words at a time, paginated except in a script
+      for currentWord in range(0, object.words, object.pageSize):
+          print(render_memory(object, currentWord, currentWord + object.pageSize, names))
+          if (currentWord + object.pageSize < object.words and not session.scripted()):
+             i = input("Press enter to continue or \"q\" to quit -> ")
+             if (i == 'q'):
+                break;
       print("\n")
 
 
       #print(object.bits, len(object.memory), (len(object.memory) * object.wordSize) - object.bits, bin(object.memory[0]))
  
-# A stupid helper function, that should be done away with
-   def myIsDigit(s):
-      if (s=='0' or s=='1' or s=='2' or s=='3' or s=='4' or s=='5' or s=='6' or s=='7' or s=='8' or s=='9'):
-         return True
-      else: 
-         return False 
-
-# This decodes the address (10 bits) and the operand (1 character)
-   def decode_address_and_operand_type(line):
-       #print "Decoding address"
-
-       i = 1
-       address = 0
-       while (myIsDigit(line[i])):
-          #print("i=", i, "Line[i]=",line[i])
-          address = 10*address + int(line[i])
-          i = i + 1
-       operandType = line[i]
-       return (address, operandType)
-
-
-# This implements the T command (opcode)
-   def execute_T():
-      if (object.debugMode):
-          print("Executing T order, program counter is ", object.programCounter)
-      if (object.programCounter == 31):
-          if (object.debugMode):
-             print("First instruction, marking the beginning")
-      else:
-          #print("In T order, not first")
-          if (object.wordHasAddress[object.programCounter] == True):
-             #print("Transferring accumulator to memory location", object.wordAddress[object.programCounter])
-             #print("Zeroing accumulator..")
-             for bit in range(0, (object.accSize)):
-                 clearBit(object.acc, bit)
-          else:
-             #print("Zeroing accumulator..")
-             for bit in range(0, (object.accSize)):
-                 clearBit(object.acc, bit)
-
-# This gets the address value in a memory address
-   def getAddressValue(address):
-       valueList = []
-       if (object.debugMode):
-          print("Getting value at address", address)
-       bitNumber = (address * object.wordSize) + 6
-       #print("BitNumber=", bitNumber)
-       for bit in range(bitNumber, bitNumber+10):
-           if (testBit(object.memory, bit) == 1):
-               valueList.append('1')
-           else:
-               valueList.append('0')
-       # print("Value list = ", valueList)
-       valueStr = ''.join(valueList)
-       value = int(valueStr, 2)
-       #print("Value=", value)
-       return value
-       #for bit in range(bitNumber, (object.wordSize)):
-       #    accStr = str(bit)
-       #print("accumlator string = ", accStr)
-
-# This gets the Order value (first 5 bits) in an address
-   def getOrderValue(address):
-       valueList = []
-       #print("Getting order value at address", address)
-       bitNumber = (address * object.wordSize)
-       #print("BitNumber=", bitNumber)
-       for bit in range(bitNumber, bitNumber+5):
-           if (testBit(object.memory, bit) == 1):
-               valueList.append('1')
-           else:
-               valueList.append('0')
-       #print("Value list = ", valueList)
-       valueStr = ''.join(valueList)
-       #print("Value String is ", valueStr)
-       #value = int(valueStr, 2)
-       #print("Value=", value)
-       return valueStr
-
-# This gets the current accumulator value
-   def getAccValue():
-       accList = []
-
-       for bit in range(0, (object.accSize)):
-           if (testBit(object.acc, bit) == 1):
-               accList.append('1')
-           else:
-               accList.append('0')
-       #print("accumlator list = ", accList)
-       accStr = ''.join(accList)
-       accInt = int(accStr,2)
-       #print("acc=", accInt)
-       return accInt
-
-# This adds a value to the accumulator
-   def addValueToAccumulator(value):
-       #value = getAddressValue(address)
-       binaryValue = str(bin(value)[2:].zfill(70))
-       accumulator = getAccValue()
-       newAcc = accumulator + value
-       #print("New acc will be", newAcc)
-       newBinaryAcc = str(bin(newAcc)[2:].zfill(70))
-       #print("Size of newBinaryAcc", len(newBinaryAcc))
-       #print("Adding Value at address ", value, "to accumulator, accumulator is ", accumulator, "value is ", value)
-       #print("New binary value is ", newBinaryAcc)
-       for bit in range(0, (object.accSize-1)):
-          if (newBinaryAcc[bit] == '1'):
-              setBit(object.acc, bit+1)
-              #print("setting Bit to 1 = ", bit)
-          else:
-              clearBit(object.acc, bit+1)
-              #print("setting Bit to 0 = ", bit)
-       newValue = getAccValue()
-       #print("New accumulator value is ", newValue)
-       return
-
-# This implements the S command (opcode)
-   def execute_S():
-       if (object.debugMode):
-          print('Executing order S')
-   #     TODO - Need to implement order S
-
-# This implements the G command (opcode)
-   def execute_G():
-       if (object.debugMode):
-          print("Executing order G")
-       if (testBit(object.acc,0) == 0):
-           accNegative = False
-           #print("Accumulator is Positive")
-       else:
-           accNegative = True
-           #print("Accumulator is Negative")
-       if (accNegative == False):
-           jumpAddress = object.wordAddress[object.programCounter]
-           if (object.debugMode):
-              print("Jumping to address", jumpAddress)
-           object.programCounter = jumpAddress-1
-           updatedSCR = str(bin(object.programCounter)[2:].zfill(10))
-           copyPCtoSCR(updatedSCR)
-       else:
-           if (object.debugMode):
-              print("Not Jumping, Accumulator is Negative")
-       if (object.debugMode):
-          print("New program counter is ", object.programCounter)
-       return
-
-# This implements the U command (opcode)
-   def execute_U():
-       accValue = getAccValue()
-       #writeAddress = address = object.wordAddress[object.programCounter]
-       writeAddress = object.wordAddress[object.programCounter]
-       writeBit = writeAddress * object.wordSize + 6
-       object.wordAddress[writeAddress] = accValue
-       if (object.debugMode):
-          print("Executing U order, acc is ", accValue, "writeBit is ", writeBit)
-       binaryValue = str(bin(accValue)[2:].zfill(10))
-       #print("New binary value for address", writeAddress," is", binaryValue)
-       for bit in range(0, (10)):
-           if (binaryValue[bit] == '1'):
-               setBit(object.memory, writeBit)
-               # print( "setting Bit to 1 = ", bit)
-           else:
-               clearBit(object.memory, writeBit)
-               # print( "setting Bit to 0 = ", bit)
-           writeBit = writeBit + 1
-       #object.wordAddress[]
-       return
-
-# This implements the A command (opcode)
-   def execute_A():
-       if (object.debugMode):
-          print("Executing A order.")
-       if (object.wordHasAddress[object.programCounter] == True):
-           value = getAddressValue(object.wordAddress[object.programCounter])
-           addValueToAccumulator(value)
-       return
-
-# This implements the O command (opcode)
-   def execute_O():
-       if (object.debugMode):
-          print("Executing O order, program counter is", object.programCounter)
-       if (object.wordHasAddress[object.programCounter] == True):
-           #address = object.wordAddress[object.programCounter]
-           orderValue = getOrderValue(object.wordAddress[object.programCounter])
-           #myOpCode = get_opcode(address)
-           #print("Order Value is ", orderValue)
-           ch = inv_opcodes[orderValue]
-           #print("{0:1}".format(testBit(object.ot, bit)),)
-           print("{0}".format(ch[0].rstrip()))
-           # TODO - This is a poors man's exit, once the S command is implemented, this can be deleted.
-           if (ch[0] == "&"):
-               print("Hit location 56")
-               print("This machine has a limited implementation of the EDSAC instruction set.")
-               print("It was implemented to demonstrate the original \"Hello!World\" program written for EDSAC.")
-               print( "Therefore, we will reset the machine at this point.")
-               x = input("Press enter to reset machine...")
-               reset()
-       return
-
-# This implements the Z command (opcode)
-   def execute_Z():
-       if (object.debugMode):
-          print( "Executing Z order.")
-       print("beep.beep.beep.")
-       ##os.system("beep -f 555 -l 460")
-       print("Stopping machine, until reset button is pressed (enter reset).")
-       object.executing = False
-
-# This decodes the opcode (first 5 bits of insruction)
-   def decode_opcode(line):
-
-       opcodeLetter = line[0]
-       opcode = opcodes[opcodeLetter]
-       #print( "Opcode found for letter", opcodeLetter, ", it is ", opcode)
-       return opcode
-
-# This loads a tape (file) into memory
+# This loads a tape (file) into memory, by booting it through the initial orders
    def load():
 
-      #  TODO - Need to copy the rest of the word into memory (including address and operand type)
       startWord = 31
-      currentWord = startWord
-      currentBit = startWord * object.wordSize
+      currentBit = object.geometry.wordStart[startWord]
       print("This command will load a program starting at word,",startWord,", which is bit",currentBit,".")
-      filename = input("Enter filename containing tape ->")
+      filename = ask("Enter filename containing tape ->")
       try:
           file=open(filename, "r")
       except IOError:
           print("<ERROR>: File not found\n")
           return
-      for line in file:
+      lines = file.readlines()
+      file.close()
+      for line in lines:
          print(line,)
-         if line[0] != "#":
-            object.wordOpcode[currentWord]=line[0]
-            opcode = decode_opcode(line)
-            #print("Loading ", opcode, " at word ", currentWord, "and bit ", currentBit)
-            if myIsDigit(line[1]):
-               strAddress, operandType = decode_address_and_operand_type(line)
-               address = int(strAddress)
-               object.wordOperandType[currentWord] = operandType
-               binaryAddress = str(bin(address)[2:].zfill(10))
-               print( "Address is ", address, ", binary address is ", binaryAddress)
-               object.wordHasAddress[currentWord] = True
-               object.wordAddress[currentWord] = address
-            else:
-               object.wordHasAddress[currentWord] = False
-               # If the address is missing, then the documentations states it is assumed 0
-               address = 0
-               binaryAddress = str(bin(address)[2:].zfill(10))
-               #print( "No address")
-               object.wordOperandType[currentWord] = line[1]
-            for bit in opcode:
-                if (bit == '1'):
-                   setBit(object.memory, currentBit)
-                else:
-                   clearBit(object.memory,currentBit)
-                currentBit = currentBit + 1
-            setBit(object.memory, currentBit) # Added to set the Spare bit to 1 - always
-            currentBit = currentBit + 1 # Added for the Spare bit between OPCODE and Address in Order
-            for bit in binaryAddress:
-                if (bit == '1'):
-                    setBit(object.memory, currentBit)
-                else:
-                    clearBit(object.memory, currentBit)
-                currentBit = currentBit + 1
-            # This sets the last bit of the Order to 1 for operand Type of D, and 0 for operand type of F
-            if (operandType == "D"):
-                setBit(object.memory, currentBit)
-            else:
-                clearBit(object.memory, currentBit)
-            #junk = input("Press enter to continue...")
-            currentWord = currentWord + 1
-            currentBit = currentWord * object.wordSize
-         #else:
-            #print("Comment, skipping.")
-      object.programLoaded = True
+      # Pressing start on the machine put the initial orders back in place before reading the tape
+      load_initial_orders(object)
+      try:
+         endWord, finished, mode = boot_tape(object, lines)
+      except (ValueError, RuntimeError) as e:
+         print("<ERROR>:", e, "\n")
+         return
+      object.tapeFile = filename
+      print("Loaded words", startWord, "to", endWord-1, "with the", mode, "boot.")
+      if (finished == False):
+         print("The tape ran out before the initial orders finished.")
+
+# This loads the last tape loaded again, or the one given, storing only the words of the lines that changed
+   def reload():
+      filename = object.tapeFile
+      if (arguments):
+         filename = arguments.pop(0)
+      if (filename is None):
+         print("No tape loaded, load one first.")
+         return
+      try:
+          file=open(filename, "r")
+      except IOError:
+          print("<ERROR>: File not found\n")
+          return
+      lines = file.readlines()
+      file.close()
+      try:
+         endWord, finished, mode, stored = reload_tape(object, lines)
+      except (ValueError, RuntimeError) as e:
+         print("<ERROR>:", e, "\n")
+         return
+      object.tapeFile = filename
+      if (mode == "incremental"):
+         changed = [address for address in stored if address >= 31]
+         print("Reloaded", filename, ",", len(changed), "words of the program stored again", changed)
+      else:
+         print("Loaded words 31 to", endWord-1, "with the", mode, "boot.")
+         if (finished == False):
+            print("The tape ran out before the initial orders finished.")
 
         
 # This allows you to list the program loaded
    def list():
        if (object.programLoaded == True):
           print("Listing assembler program...")
-          for address in sorted(object.wordOpcode.iterkeys()):
-             print( "Address %s has opcode %s, operand type %s" % (address, object.wordOpcode[address], object.wordOperandType[address]),)
-             if (object.wordHasAddress[address] == True):
+          for address in object.decoded.loadedAddresses():
+             print( "Address %s has opcode %s, operand type %s" % (address, symbols[object.decoded.opcode[address]], "FD"[object.decoded.operandType[address]]),)
+             if (object.decoded.hasAddress[address]):
                 print("and it has address",)
-                print(bject.wordAddress[address])
+                print(object.decoded.address[address])
              else:
                 print(", no address")
-          x = input("program loaded, press enter to continue...")
+          pause("program loaded, press enter to continue...")
        else:
-          x = input("No program loaded, press enter to continue...")
-
-   def get_opcode(word):
-       startBit = word * object.wordSize
-       opcode = str(testBit(object.memory,startBit)) + str(testBit(object.memory,startBit+1)) + str(testBit(object.memory,startBit+2)) + str(testBit(object.memory,startBit+3))+str(testBit(object.memory,startBit+4))
-       #print( "Opcode = ", opcode)
-       #x = input("Press enter:")
-       return opcode
-
-# This copies the current instruction to the order tank
-   def copyInstructiontoOT(address):
-       # type: (object) -> object
-       #print("Copying address ", address, "to order tank.")
-       bitNumber = address * object.wordSize
-       otBit = 0
-       for bit in range(bitNumber, (object.otSize+bitNumber)):
-           if (testBit(object.memory, bit) == 1):
-               setBit(object.ot, otBit)
-           else:
-               clearBit(object.ot, otBit)
-           otBit = otBit + 1
-
-# This copies the program counter to the sequence control registers (which was the program counter in the actual EDSAC)
-   def copyPCtoSCR(updatedSCR):
-       # print("Copying ", updatedSCR, "to SCR")
-       for bit in range(0, (object.scrSize)):
-           if (updatedSCR[bit] == '1'):
-               # print("Setting bit", bit, "to 1")
-               setBit(object.scr, bit)
-           else:
-               clearBit(object.scr, bit)
-               # print("Setting bit", bit, "to 0")
-               # scr()
+          print("No program loaded.")
+          pause("press enter to continue...")
 
 # This enables step mode in the simulator so that you can execute one instruction at a time
    def step():
@@ -741,45 +630,109 @@ def cli(object):
          print("No program loaded.")
          return
 
-      object.executing = True
-
       if (object.stepMode == True):
           print("In step mode..")
 
       print("Starting execution at word ", object.programCounter)
+      address = object.programCounter
 
-      opcodeExecution = {
-          '00111': execute_U,
-          '01100': execute_S,
-          '11011': execute_G,
-          '01101': execute_Z,
-          '00101': execute_T,
-          '01001': execute_O,
-          '11100': execute_A
-      }
-
-      while (object.executing == True):
-
-         copyInstructiontoOT(object.programCounter)
-         opcode = get_opcode(object.programCounter)
-         updatedSCR = str(bin(object.programCounter)[2:].zfill(10))
-         copyPCtoSCR(updatedSCR)
-         #print("Executing at ", updatedSCR)
-
-         try:
-            opcodeExecution[opcode]()
-            object.programCounter = object.programCounter+1
-         except IOError as e:
-            print("I/O error({0}): {1}".format(e.errno, e.strerror))
-         except ValueError:
-             print("Value error.")
-         except:
-             print("Unexpected error:", sys.exc_info()[0])
-             raise
-             exit()
-
-         if (object.stepMode == True):
-             return
+      # A cached result can only stand in for a run nobody is watching
+      if (object.resultCache is not None and object.profiler is None and object.pacer is None and object.recorder is None):
+         result = run_cached(object, object.resultCache)
+         if (result['cached'] and object.debugMode):
+            print("Result taken from the cache.")
+      else:
+         result = run(object, profiler=object.profiler, pacer=object.pacer, recorder=object.recorder)
+      if (object.debugMode):
+         print("Executed", result['steps'], "orders, taking", format_time(result['simulatedTime']), "on the machine.")
+      if (object.stepMode == True and result['steps'] == 1):
+         print(render_step(object, address))
+
+      if (object.resetRequested == True):
+         pause("Press enter to reset machine...")
+         reset()
+
+# This sets the speed to pace execution at, as a multiple of the real machine's speed
+   def pace():
+       speed = ask("Enter speed as a multiple of the real machine, or enter to run flat out ->")
+       try:
+           speed = float(speed or 0)
+       except ValueError:
+           print("<ERROR>: Not a number\n")
+           return
+       if (speed <= 0):
+           print("Running at full speed.")
+           object.pacer = None
+       else:
+           print("Running at", speed, "times the speed of the real machine.")
+           object.pacer = Pacer(speed)
+
+# This starts recording a trace of the orders executed to a file, or stops the recording
+   def record():
+       if (object.recorder is not None):
+           close_recorder()
+           print("Trace recording stopped.")
+           return
+       filename = ask("Enter filename for the trace ->")
+       if (filename == ""):
+          do_nothing()
+          return
+       try:
+          object.recorder = TraceWriter(filename, geometry=object.geometry)
+       except IOError:
+          print("<ERROR>: Could not write file\n")
+          return
+       print("Recording a trace of every order executed to", filename)
+
+# This turns the cache of run results on or off
+   def cache():
+       if (object.resultCache is not None):
+           print("Turning the result cache off, it had", object.resultCache.hits, "hits and", object.resultCache.misses, "misses.")
+           object.resultCache = None
+           return
+       directory = ask("Enter a directory to keep results in, or enter to keep them in memory only ->")
+       if (directory == ""):
+           directory = None
+       try:
+           object.resultCache = ResultCache(directory=directory)
+       except OSError:
+           print("<ERROR>: Could not use directory\n")
+           return
+       print("Turning the result cache on.")
+
+# This turns the execution profiler on or off, turning it on clears the counts
+   def profile():
+       if (object.profiler is None):
+           print("Turning profiling on.")
+           object.profiler = Profiler(object.words)
+       else:
+           print("Turning profiling off.")
+           object.profiler = None
+
+# This prints the profile counts merged into the program listing
+   def profilereport():
+       if (object.profiler is None):
+           print("Profiling is off, turn it on with profile.")
+           return
+       print("Orders executed", object.profiler.orders, ", orders per second", int(object.profiler.ordersPerSecond()))
+       for opcode, count in sorted(object.profiler.opcodeCounts.items()):
+           print("{0:1} - {1}".format(inv_opcodes[opcode][0], count))
+       for line in object.profiler.annotated_listing(object):
+           print(line)
+
+# This saves the profile counts as CSV, or JSON if the file name ends in .json
+   def profilesave():
+       if (object.profiler is None):
+           print("Profiling is off, turn it on with profile.")
+           return
+       filename = ask("Enter filename for the profile ->")
+       if (filename == ""):
+          do_nothing()
+          return
+       try:
+          object.profiler.save(filename)
+       except IOError:
+          print("<ERROR>: Could not write file\n")
 
 # debugging command used to set the accumulator to all 1's
    def testacc():
@@ -797,10 +750,42 @@ def cli(object):
            object.debugMode = True
 
 
+# This switches between the faithful and accelerated boot of tapes
+   def bootmode():
+       if (object.bootMode == "accelerated"):
+           object.bootMode = "faithful"
+       else:
+           object.bootMode = "accelerated"
+       print("Tapes will be booted in", object.bootMode, "mode.")
+
+
+# This runs the commands in a script file, then comes back to this prompt
+   def source():
+       filename = ask("Enter filename containing the script ->")
+       if (filename == ""):
+          do_nothing()
+          return
+       try:
+          session.source(filename)
+       except IOError:
+          print("<ERROR>: File not found\n")
+
 # Helper function for the CLI.
    def do_nothing():
       print("Doing nothing!")
 
+# These are the parts of the machine dump can be given, e.g. "dump acc"
+#
+   dumps = {
+               'acc':acc,
+               'scr':scr,
+               'ot':ot,
+               'multiplier':multiplier,
+               'multiplicand':multiplicand,
+               'registers':registers,
+               'memory':memory,
+             }
+
 # This is the menu for the CLI, actually this is a pattern in Python that
 # uses a dictionary to issue a function call. So if you type the key, the key[index] is executed.
 #
@@ -820,6 +805,7 @@ def cli(object):
                 'd':dump,
                'load':load,
                'l':load,
+               'reload':reload,
                'registers':registers,
                'acc':acc,
                'a':acc,
@@ -835,14 +821,27 @@ def cli(object):
                'step':step,
                's':step,
                'debug':debug,
+               'profile':profile,
+               'cache':cache,
+               'record':record,
+               'pace':pace,
+               'profilereport':profilereport,
+               'profilesave':profilesave,
+               'bootmode':bootmode,
                'testacc':testacc,
+               'source':source,
                '':do_nothing,
              }
 
    print_welcome()
 
    while True:
-     c1 = input(prompt)
+     words = session.read_command(prompt).split()
+     # Whatever follows the command is kept for ask() to answer its questions with
+     c1 = ""
+     if (words):
+        c1 = words[0]
+     arguments[:] = words[1:]
      #print("Command entered is ", c1)
      # The following is the PYTHONIC way to do a case statement using a dictionary 
      try:
@@ -861,11 +860,23 @@ def cli(object):
      #else
         #print("Command not yet implemented.")
 
-def main():
-  os.system('clear')
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="The EDSAC simulator.")
+  parser.add_argument("--script", help="run the commands in this file, then exit")
+  options = parser.parse_args(argv)
+
+  session = Session(exitAtEnd=(options.script is not None))
+  if (options.script is not None):
+     try:
+        session.source(options.script)
+     except IOError:
+        sys.exit("<ERROR>: Script " + options.script + " not found")
+  else:
+     os.system('clear')
 
   # Create the initial EDSAC object instantiation
   edsac1=EDSAC("edsac1")
-  cli(edsac1)
+  cli(edsac1, session)
 
-main() 
+if __name__ == "__main__":
+  main()
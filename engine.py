@@ -0,0 +1,412 @@
+#
+# The execution engine.
+#
+# These routines fetch, decode and execute the orders of a loaded program.
+# Like the tape routines they take the machine to work on as their first
+# argument, so the CLI and any other code driving a machine share them.
+#
+# The orders implemented so far are the ones needed by the "Hello!World"
+# program, see the TODOs below.
+#
+import sys
+from time import perf_counter
+from bitutils import testBit
+from bitutils import setBit
+from bitutils import clearBit
+from bitutils import getBits
+from codec import opcodes
+from codec import symbols
+from tape import programStart
+
+# The version of what the orders do.  Change it whenever an order behaves
+# differently, so that results cached by an earlier engine are not reused.
+engineVersion = 4
+
+# The parts of the machine a run starts from and changes
+stateArrays = ('memory', 'acc', 'scr', 'ot', 'multiplier', 'multiplicand')
+
+# The orders that transfer control, taken branches are counted by the profiler
+branchOpcodes = (opcodes['E'], opcodes['G'])
+
+# This implements the T command (opcode)
+def execute_T(object):
+   if (object.debugMode):
+       print("Executing T order, program counter is ", object.programCounter)
+   if (object.programCounter == 31):
+       if (object.debugMode):
+          print("First instruction, marking the beginning")
+   else:
+       #print("In T order, not first")
+       # An order with no address given, TF, is T0F and stores to word 0
+       #print("Transferring accumulator to memory location", object.decoded.address[object.programCounter])
+       storeAccumulator(object)
+       #print("Zeroing accumulator..")
+       for bit in range(0, (object.accSize)):
+           clearBit(object.acc, bit)
+
+# This gets the address value in a memory address
+def getAddressValue(object, address):
+    valueList = []
+    if (object.debugMode):
+       print("Getting value at address", address)
+    bitNumber = object.geometry.addressStart[address]
+    #print("BitNumber=", bitNumber)
+    for bit in range(bitNumber, bitNumber+object.geometry.addressBits):
+        if (testBit(object.memory, bit) == 1):
+            valueList.append('1')
+        else:
+            valueList.append('0')
+    # print("Value list = ", valueList)
+    valueStr = ''.join(valueList)
+    value = int(valueStr, 2)
+    #print("Value=", value)
+    return value
+    #for bit in range(bitNumber, (object.wordSize)):
+    #    accStr = str(bit)
+    #print("accumlator string = ", accStr)
+
+# This gets the Order value (first 5 bits) in an address
+def getOrderValue(object, address):
+    valueList = []
+    #print("Getting order value at address", address)
+    bitNumber = object.geometry.opcodeStart[address]
+    #print("BitNumber=", bitNumber)
+    for bit in range(bitNumber, bitNumber+object.geometry.opcodeBits):
+        if (testBit(object.memory, bit) == 1):
+            valueList.append('1')
+        else:
+            valueList.append('0')
+    #print("Value list = ", valueList)
+    valueStr = ''.join(valueList)
+    #print("Value String is ", valueStr)
+    #value = int(valueStr, 2)
+    #print("Value=", value)
+    return valueStr
+
+# This gets the current accumulator value
+def getAccValue(object):
+    accList = []
+
+    for bit in range(0, (object.accSize)):
+        if (testBit(object.acc, bit) == 1):
+            accList.append('1')
+        else:
+            accList.append('0')
+    #print("accumlator list = ", accList)
+    accStr = ''.join(accList)
+    accInt = int(accStr,2)
+    #print("acc=", accInt)
+    return accInt
+
+# This adds a value to the accumulator
+def addValueToAccumulator(object, value):
+    #value = getAddressValue(object, address)
+    binaryValue = str(bin(value)[2:].zfill(70))
+    accumulator = getAccValue(object)
+    newAcc = accumulator + value
+    #print("New acc will be", newAcc)
+    newBinaryAcc = str(bin(newAcc)[2:].zfill(70))
+    #print("Size of newBinaryAcc", len(newBinaryAcc))
+    #print("Adding Value at address ", value, "to accumulator, accumulator is ", accumulator, "value is ", value)
+    #print("New binary value is ", newBinaryAcc)
+    for bit in range(0, (object.accSize-1)):
+       if (newBinaryAcc[bit] == '1'):
+           setBit(object.acc, bit+1)
+           #print("setting Bit to 1 = ", bit)
+       else:
+           clearBit(object.acc, bit+1)
+           #print("setting Bit to 0 = ", bit)
+    newValue = getAccValue(object)
+    #print("New accumulator value is ", newValue)
+    return
+
+# This implements the S command (opcode)
+def execute_S(object):
+    if (object.debugMode):
+       print('Executing order S')
+#     TODO - Need to implement order S
+
+# This implements the G command (opcode)
+def execute_G(object):
+    if (object.debugMode):
+       print("Executing order G")
+    if (testBit(object.acc,0) == 0):
+        accNegative = False
+        #print("Accumulator is Positive")
+    else:
+        accNegative = True
+        #print("Accumulator is Negative")
+    if (accNegative == False):
+        jumpAddress = object.decoded.address[object.programCounter]
+        if (object.debugMode):
+           print("Jumping to address", jumpAddress)
+        object.programCounter = jumpAddress-1
+        updatedSCR = str(bin(object.programCounter)[2:].zfill(object.scrSize))
+        copyPCtoSCR(object, updatedSCR)
+    else:
+        if (object.debugMode):
+           print("Not Jumping, Accumulator is Negative")
+    if (object.debugMode):
+       print("New program counter is ", object.programCounter)
+    return
+
+# This stores the accumulator into the address field of the word the order
+# addresses, as the U and T orders do.  The store goes through the machine,
+# whose listeners decode the word again and note the write.
+def storeAccumulator(object):
+    accValue = getAccValue(object)
+    writeAddress = object.decoded.address[object.programCounter]
+    if (object.debugMode):
+       print("Storing acc ", accValue, "in the address of word ", writeAddress)
+    addressBits = object.geometry.addressBits
+    binaryValue = str(bin(accValue)[2:].zfill(addressBits))
+    #print("New binary value for address", writeAddress," is", binaryValue)
+    object.store_bits(writeAddress, object.geometry.addressField[0], addressBits, int(binaryValue[0:addressBits], 2))
+
+# This implements the U command (opcode)
+def execute_U(object):
+    if (object.debugMode):
+       print("Executing U order.")
+    storeAccumulator(object)
+    return
+
+# This is a store listener of the machine, it notes the word written for the trace recorder
+def note_last_write(object, start, end, old, new):
+    object.lastWrite = start
+
+# This implements the A command (opcode)
+def execute_A(object):
+    if (object.debugMode):
+       print("Executing A order.")
+    value = getAddressValue(object, object.decoded.address[object.programCounter])
+    addValueToAccumulator(object, value)
+    return
+
+# This implements the O command (opcode)
+def execute_O(object):
+    if (object.debugMode):
+       print("Executing O order, program counter is", object.programCounter)
+    #address = object.decoded.address[object.programCounter]
+    orderValue = getOrderValue(object, object.decoded.address[object.programCounter])
+    #myOpCode = get_opcode(object, address)
+    #print("Order Value is ", orderValue)
+    ch = symbols[int(orderValue, 2)]
+    #print("{0:1}".format(testBit(object.ot, bit)),)
+    object.output.append(ch)
+    if (object.verbose):
+        print("{0}".format(ch))
+    # TODO - This is a poors man's exit, once the S command is implemented, this can be deleted.
+    # The machine stops here and asks whoever is driving it (the CLI) to reset it.
+    if (ch == "&"):
+        if (object.verbose):
+            print("Hit location 56")
+            print("This machine has a limited implementation of the EDSAC instruction set.")
+            print("It was implemented to demonstrate the original \"Hello!World\" program written for EDSAC.")
+            print( "Therefore, we will reset the machine at this point.")
+        object.executing = False
+        object.resetRequested = True
+    return
+
+# This implements the Z command (opcode)
+def execute_Z(object):
+    if (object.debugMode):
+       print( "Executing Z order.")
+    if (object.verbose):
+        print("beep.beep.beep.")
+        ##os.system("beep -f 555 -l 460")
+        print("Stopping machine, until reset button is pressed (enter reset).")
+    object.executing = False
+
+def get_opcode(object, word):
+    startBit = object.geometry.opcodeStart[word]
+    opcode = str(testBit(object.memory,startBit)) + str(testBit(object.memory,startBit+1)) + str(testBit(object.memory,startBit+2)) + str(testBit(object.memory,startBit+3))+str(testBit(object.memory,startBit+4))
+    #print( "Opcode = ", opcode)
+    #x = input("Press enter:")
+    return opcode
+
+# This copies the current instruction to the order tank
+def copyInstructiontoOT(object, address):
+    # type: (object) -> object
+    #print("Copying address ", address, "to order tank.")
+    bitNumber = object.geometry.wordStart[address]
+    otBit = 0
+    for bit in range(bitNumber, (object.otSize+bitNumber)):
+        if (testBit(object.memory, bit) == 1):
+            setBit(object.ot, otBit)
+        else:
+            clearBit(object.ot, otBit)
+        otBit = otBit + 1
+
+# This copies the program counter to the sequence control registers (which was the program counter in the actual EDSAC)
+def copyPCtoSCR(object, updatedSCR):
+    # print("Copying ", updatedSCR, "to SCR")
+    for bit in range(0, (object.scrSize)):
+        if (updatedSCR[bit] == '1'):
+            # print("Setting bit", bit, "to 1")
+            setBit(object.scr, bit)
+        else:
+            clearBit(object.scr, bit)
+            # print("Setting bit", bit, "to 0")
+            # scr()
+
+
+opcodeExecution = {
+    '00111': execute_U,
+    '01100': execute_S,
+    '11011': execute_G,
+    '01101': execute_Z,
+    '00101': execute_T,
+    '01001': execute_O,
+    '11100': execute_A
+}
+
+# This executes the order at the program counter and moves on to the next one,
+# returning the opcode executed.
+def execute_order(object):
+    copyInstructiontoOT(object, object.programCounter)
+    opcode = get_opcode(object, object.programCounter)
+    updatedSCR = str(bin(object.programCounter)[2:].zfill(object.scrSize))
+    copyPCtoSCR(object, updatedSCR)
+    #print("Executing at ", updatedSCR)
+
+    try:
+        opcodeExecution[opcode](object)
+        object.programCounter = object.programCounter+1
+    except IOError as e:
+        print("I/O error({0}): {1}".format(e.errno, e.strerror))
+    except ValueError as e:
+        # The order can not be carried out, so the machine stops on it rather than trying it again
+        print("Value error:", e)
+        object.executing = False
+    except:
+        print("Unexpected error:", sys.exc_info()[0])
+        raise
+    return opcode
+
+# This runs the loaded program from the program counter until it stops, for
+# one order in step mode, or for at most maxSteps orders.  A profiler, when
+# given, counts what is executed, a recorder (tracefile.TraceWriter) writes a
+# trace of it, a logger (render.StepLogger, or any function taking the machine
+# and the address of the order) is called after every order, and a pacer
+# (timing.Pacer) holds the run back to the speed of the real machine; without
+# them the loop does no extra work.  The simulated
+# time of every order is added to the machine's clock.
+#
+# It returns a dictionary describing the run.
+def run(object, maxSteps=None, profiler=None, pacer=None, recorder=None, logger=None):
+    object.executing = True
+    object.resetRequested = False
+    if (object.stepMode == True):
+        maxSteps = 1
+    steps = 0
+    outputStart = len(object.output)
+    orderTimes = object.timing.orderTimes
+    wordStart = object.geometry.wordStart
+    simulatedStart = object.simulatedTime
+    simulatedTime = simulatedStart
+    startTime = perf_counter()
+
+    try:
+        if (profiler is None and pacer is None and recorder is None and logger is None):
+            while (object.executing == True):
+                if (maxSteps is not None and steps >= maxSteps):
+                    break
+                simulatedTime += orderTimes[execute_order(object)]
+                steps = steps + 1
+        else:
+            if (profiler is not None):
+                opcodeCounts = profiler.opcodeCounts
+                addressCounts = profiler.addressCounts
+                branchCounts = profiler.branchCounts
+            if (pacer is not None):
+                pacer.start(simulatedTime)
+                nextPace = simulatedTime + pacer.batchTime
+            while (object.executing == True):
+                if (maxSteps is not None and steps >= maxSteps):
+                    break
+                address = object.programCounter
+                object.lastWrite = None
+                opcode = execute_order(object)
+                simulatedTime += orderTimes[opcode]
+                steps = steps + 1
+                if (profiler is not None):
+                    opcodeCounts[opcode] = opcodeCounts.get(opcode, 0) + 1
+                    addressCounts[address] += 1
+                    if (opcode in branchOpcodes and object.programCounter != address + 1):
+                        branchCounts[address] += 1
+                if (recorder is not None):
+                    writeAddress = object.lastWrite
+                    if (writeAddress is None):
+                        recorder.record(address, getBits(object.ot, 0, object.otSize), getAccValue(object))
+                    else:
+                        recorder.record(address, getBits(object.ot, 0, object.otSize), getAccValue(object),
+                                        writeAddress, getBits(object.memory, wordStart[writeAddress], object.wordSize))
+                if (logger is not None):
+                    logger(object, address)
+                if (pacer is not None and simulatedTime >= nextPace):
+                    nextPace = pacer.pace(simulatedTime)
+            if (pacer is not None):
+                pacer.pace(simulatedTime)
+    finally:
+        object.simulatedTime = simulatedTime
+
+    elapsed = perf_counter() - startTime
+    if (profiler is not None):
+        profiler.orders += steps
+        profiler.elapsed += elapsed
+    return {
+        'steps': steps,
+        'elapsed': elapsed,
+        'simulatedTime': simulatedTime - simulatedStart,
+        'programCounter': object.programCounter,
+        'stopped': not object.executing,
+        'resetRequested': object.resetRequested,
+        'output': ''.join(object.output[outputStart:]),
+    }
+
+# This runs the loaded program like run(), pressing start again each time it
+# stops, up to starts times in all, as the CLI does for programs that stop and
+# wait to be continued.  maxSteps limits the orders executed by all the runs
+# together, and the result adds up the steps, times and output of them all.
+def run_starts(object, maxSteps, starts=1):
+    result = run(object, maxSteps)
+    for start in range(1, starts):
+        if (not result['stopped'] or result['resetRequested']):
+            break
+        nextResult = run(object, maxSteps - result['steps'])
+        for name in ('steps', 'elapsed', 'simulatedTime', 'output'):
+            nextResult[name] = result[name] + nextResult[name]
+        result = nextResult
+    return result
+
+# This puts a copy of the arrays the state of a machine is kept in, memory
+# and the registers, into a dictionary, for reset_machine()
+def machine_arrays(object):
+    arrays = {}
+    for name in stateArrays:
+        arrays[name] = getattr(object, name)[:]
+    return arrays
+
+# This puts a machine back into the state of a new one, given the arrays of a
+# new machine.  Memory is restored through the machine, so the decoded table
+# decodes the words that changed.
+def reset_machine(object, pristine):
+    for name in stateArrays:
+        if (name == 'memory'):
+            object.restore_memory(pristine[name])
+        else:
+            getattr(object, name)[:] = pristine[name]
+    object.decoded.markLoaded(0, 0)
+    object.programLoaded = False
+    object.programCounter = programStart
+    object.executing = False
+    object.stepMode = False
+    object.resetRequested = False
+    object.output = []
+    object.simulatedTime = 0
+    object.lastWrite = None
+    object.tapeFile = None
+    object.tapeSource = None
+    object.tapeOrders = None
+    object.tapeEnd = None
+    object.tapeWritten = None
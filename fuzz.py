@@ -0,0 +1,201 @@
+#
+# Differential fuzzing of the execution engines.
+#
+# Every faster way of running a program has to end in exactly the state the
+# reference interpreter (engine.run() with nothing attached) ends in.  This
+# generates random program tapes from the orders in engine.opcodes, with U
+# orders that store into the program itself, runs each on the reference and
+# on every other engine registered below, and compares the final memory,
+# registers, output and step count.  When an engine disagrees the tape is
+# shrunk, an order at a time, to the smallest tape that still shows it.
+#
+# Tapes are run in parallel worker processes.  Run it with
+#
+#   python3 fuzz.py [--runs N] [--workers N] [--seed N] [--length N] [--steps N]
+#
+# or make fuzz.  It exits with status 1 when any engine disagrees.
+#
+import argparse
+import contextlib
+import io
+import random
+import sys
+from multiprocessing import Pool
+import engine
+import tape
+from cache import ResultCache
+from cache import run_cached
+from profiler import Profiler
+from render import StepLogger
+
+# The letters whose orders the engine can execute, and all the letters that can be punched as data
+executableLetters = sorted(letter for letter, bits in engine.opcodes.items() if bits in engine.opcodeExecution)
+dataLetters = sorted(engine.opcodes)
+
+# This builds a random program tape of the given number of orders, loaded from word 31
+def generate_tape(rng, length):
+   end = tape.programStart + length + 1
+   orders = []
+   for index in range(0, length):
+      if (rng.random() < 0.2):
+         letter = rng.choice(dataLetters)
+      else:
+         letter = rng.choice(executableLetters)
+      if (letter == 'U' or rng.random() < 0.8):
+         # Mostly addresses inside the program, so stores modify its orders
+         address = rng.randrange(tape.programStart, end)
+      else:
+         address = rng.randrange(0, 1024)
+      orders.append((letter, address, rng.choice("FD")))
+   orders.append(('Z', 0, 'F'))
+   return orders
+
+# This punches the orders as tape lines, starting with the T order the initial orders stop loading at
+def tape_lines(orders):
+   lines = ["T%dF" % (tape.programStart + len(orders) + 1)]
+   for letter, address, operandType in orders:
+      if (address == 0):
+         lines.append("%s%s" % (letter, operandType))
+      else:
+         lines.append("%s%d%s" % (letter, address, operandType))
+   return lines
+
+# This describes the state a run left the machine in, for comparing engines
+def outcome(object, result, error):
+   return {
+      'memory': object.memory.tobytes(),
+      'acc': object.acc.tobytes(),
+      'scr': object.scr.tobytes(),
+      'ot': object.ot.tobytes(),
+      'programCounter': object.programCounter,
+      'output': ''.join(object.output),
+      'steps': result and result['steps'],
+      'simulatedTime': object.simulatedTime,
+      'error': error,
+   }
+
+def new_machine(lines, bootMode="accelerated"):
+   from edsac import EDSAC
+   object = EDSAC("fuzz", verbose=False)
+   tape.boot_tape(object, lines, bootMode)
+   return object
+
+# This runs a machine with the given run function, catching what the program raises
+def run_machine(object, runFunction):
+   result = None
+   error = None
+   try:
+      with contextlib.redirect_stdout(io.StringIO()):
+         result = runFunction(object)
+   except Exception as e:
+      error = type(e).__name__
+   return outcome(object, result, error)
+
+# The engines.  Each takes the tape lines and a step limit, and returns an outcome.
+def reference_engine(lines, maxSteps):
+   return run_machine(new_machine(lines), lambda object: engine.run(object, maxSteps))
+
+def profiled_engine(lines, maxSteps):
+   object = new_machine(lines)
+   return run_machine(object, lambda object: engine.run(object, maxSteps, profiler=Profiler(object.words)))
+
+def logged_engine(lines, maxSteps):
+   return run_machine(new_machine(lines), lambda object: engine.run(object, maxSteps, logger=StepLogger(io.StringIO())))
+
+def faithful_boot_engine(lines, maxSteps):
+   return run_machine(new_machine(lines, "faithful"), lambda object: engine.run(object, maxSteps))
+
+# The second run of the same tape is answered from the cache
+def cached_engine(lines, maxSteps):
+   cache = ResultCache()
+   run_machine(new_machine(lines), lambda object: run_cached(object, cache, maxSteps=maxSteps))
+   return run_machine(new_machine(lines), lambda object: run_cached(object, cache, maxSteps=maxSteps))
+
+referenceEngine = reference_engine
+
+engines = {
+   'profiled': profiled_engine,
+   'logged': logged_engine,
+   'faithfulboot': faithful_boot_engine,
+   'cached': cached_engine,
+   }
+
+# This adds an engine to be checked against the reference
+def register_engine(name, function):
+   engines[name] = function
+
+# This returns the names of the engines that disagree with the reference on a tape
+def divergent_engines(orders, maxSteps, names=None):
+   lines = tape_lines(orders)
+   expected = referenceEngine(lines, maxSteps)
+   divergent = []
+   for name in (names or sorted(engines)):
+      if (engines[name](lines, maxSteps) != expected):
+         divergent.append(name)
+   return divergent
+
+# An order that does nothing, used in place of an order that does not matter
+# when removing it would move the orders after it
+neutralOrder = ('S', 0, 'F')
+
+# This removes orders, replaces them with the neutral order and simplifies
+# their addresses, for as long as the engine still disagrees
+def shrink(orders, name, maxSteps):
+   orders = list(orders)
+   changed = True
+   while (changed):
+      changed = False
+      chunk = max(len(orders) // 2, 1)
+      while (chunk >= 1):
+         index = 0
+         while (index < len(orders)):
+            candidate = orders[:index] + orders[index + chunk:]
+            if (candidate and divergent_engines(candidate, maxSteps, [name])):
+               orders = candidate
+               changed = True
+            else:
+               index = index + chunk
+         chunk = chunk // 2
+      for index in range(0, len(orders)):
+         letter, address, operandType = orders[index]
+         for simpler in (neutralOrder, (letter, 0, operandType), (letter, address, 'F')):
+            candidate = orders[:index] + [simpler] + orders[index + 1:]
+            if (simpler != orders[index] and divergent_engines(candidate, maxSteps, [name])):
+               orders = candidate
+               changed = True
+               break
+   return orders
+
+# This is run in a worker process for each seed
+def check_seed(arguments):
+   seed, length, maxSteps = arguments
+   rng = random.Random(seed)
+   orders = generate_tape(rng, rng.randrange(1, length + 1))
+   return seed, orders, divergent_engines(orders, maxSteps)
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description="Compare the execution engines on random tapes.")
+   parser.add_argument("--runs", type=int, default=200, help="number of random tapes")
+   parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per CPU")
+   parser.add_argument("--seed", type=int, default=0, help="first random seed")
+   parser.add_argument("--length", type=int, default=30, help="most orders in a tape")
+   parser.add_argument("--steps", type=int, default=500, help="most orders executed per run")
+   options = parser.parse_args(argv)
+
+   failures = 0
+   jobs = [(seed, options.length, options.steps) for seed in range(options.seed, options.seed + options.runs)]
+   with Pool(options.workers) as pool:
+      for seed, orders, divergent in pool.imap_unordered(check_seed, jobs):
+         for name in divergent:
+            failures = failures + 1
+            smallest = shrink(orders, name, options.steps)
+            print("Engine", name, "disagrees with the reference for seed", seed, ", smallest tape:")
+            for line in tape_lines(smallest):
+               print("   ", line)
+   print("Checked", options.runs, "tapes against", len(engines), "engines,", failures, "disagreements.")
+   if (failures):
+      return 1
+   return 0
+
+if __name__ == "__main__":
+   sys.exit(main())
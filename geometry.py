@@ -0,0 +1,70 @@
+#
+# The shape of the machine's store.
+#
+# The store of the real machine held 1024 short words of 17 bits.  An order
+# in a word has a 5 bit opcode, a spare bit, a 10 bit address and a length
+# bit saying whether the operand is a short (F) or a long (D) number.
+#
+# A Geometry describes the store size, the word width and where each of those
+# fields sits in a word, each field given as (first bit, width).  The bit
+# where every field of every word starts is worked out once, here, into
+# tables indexed by word address, so fetching and decoding an order is a
+# table lookup rather than a multiplication.  Machines built with the same
+# geometry share its tables.
+#
+# Other geometries model smaller, larger or wider stores.  In a store smaller
+# than the address field can reach, an order's address wraps round the store
+# (see decode.py).  The initial orders only work with the standard fields of
+# a 17 bit word, see tape.py.
+#
+import array
+
+class Geometry():
+   def __init__(self, words=1024, wordSize=17, opcodeField=(0, 5), spareField=(5, 1),
+                addressField=(6, 10), lengthField=(16, 1)):
+      self.words = words
+      self.wordSize = wordSize
+      self.opcodeField = opcodeField
+      self.spareField = spareField
+      self.addressField = addressField
+      self.lengthField = lengthField
+
+      # The engine decodes 5 bit opcodes and a single length bit
+      if (opcodeField[1] != 5):
+         raise ValueError("The opcode field must be 5 bits")
+      if (lengthField[1] != 1):
+         raise ValueError("The length field must be 1 bit")
+      if (addressField[1] < 1 or addressField[1] > 16):
+         raise ValueError("The address field must be 1 to 16 bits")
+      if (words < 1):
+         raise ValueError("The store must have at least one word")
+      used = set()
+      for first, width in (opcodeField, spareField, addressField, lengthField):
+         if (first < 0 or first + width > wordSize):
+            raise ValueError("Field at bit %d does not fit a %d bit word" % (first, wordSize))
+         field = set(range(first, first + width))
+         if (used & field):
+            raise ValueError("Field at bit %d overlaps another field" % first)
+         used |= field
+
+      self.bits = words * wordSize + 1
+      self.opcodeBits = opcodeField[1]
+      self.addressBits = addressField[1]
+
+      # The first bit of each word, and of its opcode, address and length fields
+      self.wordStart = array.array('L', range(0, words * wordSize, wordSize))
+      self.opcodeStart = array.array('L', [start + opcodeField[0] for start in self.wordStart])
+      self.addressStart = array.array('L', [start + addressField[0] for start in self.wordStart])
+      self.lengthStart = array.array('L', [start + lengthField[0] for start in self.wordStart])
+
+   # This says whether words are laid out as on the real machine, which the initial orders need
+   def standardWord(self):
+      return (self.wordSize == 17 and self.opcodeField == (0, 5) and self.spareField == (5, 1)
+              and self.addressField == (6, 10) and self.lengthField == (16, 1))
+
+   def __repr__(self):
+      return "Geometry(%d, %d, %r, %r, %r, %r)" % (self.words, self.wordSize, self.opcodeField,
+                                                  self.spareField, self.addressField, self.lengthField)
+
+# The store of the real machine, shared by every machine built without a geometry
+standardGeometry = Geometry()
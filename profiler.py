@@ -0,0 +1,100 @@
+#
+# The execution profiler.
+#
+# A Profiler is handed to engine.run(), which then counts every order it
+# executes: by opcode, by the address it was fetched from, and for the E and G
+# orders whether the branch was taken.  The counts for the 1024 addresses are
+# kept in arrays allocated once, so counting is a plain index.  When no profiler
+# is given the run loop does none of this.
+#
+# The counts can be saved as CSV or JSON, or merged into the program listing
+# to find the hot loops of a tape.
+#
+import array
+import csv
+import json
+from codec import inv_opcodes
+from codec import symbols
+from engine import branchOpcodes
+
+class Profiler():
+   def __init__(self, words):
+      self.words = words
+      self.reset()
+
+   # This clears all the counts
+   def reset(self):
+      # Orders executed, keyed by the opcode bits used in engine.opcodeExecution
+      self.opcodeCounts = {}
+      # Orders executed at each address
+      self.addressCounts = array.array('L', [0]) * self.words
+      # Branches taken by the E or G order at each address
+      self.branchCounts = array.array('L', [0]) * self.words
+      # Total orders executed and the time spent executing them, in seconds
+      self.orders = 0
+      self.elapsed = 0.0
+
+   def ordersPerSecond(self):
+      if (self.elapsed == 0):
+         return 0.0
+      return self.orders / self.elapsed
+
+   # This returns the counts as a dictionary, only listing addresses that were executed
+   def summary(self):
+      opcodeCounts = {}
+      for opcode, count in self.opcodeCounts.items():
+         opcodeCounts[inv_opcodes[opcode][0]] = count
+      addresses = {}
+      for address in range(0, self.words):
+         if (self.addressCounts[address]):
+            addresses[address] = {'count': self.addressCounts[address], 'taken': self.branchCounts[address]}
+      return {
+         'orders': self.orders,
+         'elapsed': self.elapsed,
+         'ordersPerSecond': self.ordersPerSecond(),
+         'opcodes': opcodeCounts,
+         'addresses': addresses,
+      }
+
+   def to_json(self, file):
+      json.dump(self.summary(), file, indent=1)
+
+   # The CSV has one row per opcode and one per address executed
+   def to_csv(self, file):
+      writer = csv.writer(file)
+      writer.writerow(['kind', 'key', 'count', 'taken'])
+      writer.writerow(['total', 'orders', self.orders, ''])
+      writer.writerow(['total', 'ordersPerSecond', round(self.ordersPerSecond(), 1), ''])
+      for opcode, count in sorted(self.opcodeCounts.items()):
+         writer.writerow(['opcode', inv_opcodes[opcode][0], count, ''])
+      for address in range(0, self.words):
+         if (self.addressCounts[address]):
+            writer.writerow(['address', address, self.addressCounts[address], self.branchCounts[address]])
+
+   # This saves the counts, as JSON when the file name ends in .json and CSV otherwise
+   def save(self, filename):
+      with open(filename, "w", newline="") as file:
+         if (filename.endswith(".json")):
+            self.to_json(file)
+         else:
+            self.to_csv(file)
+
+   # This returns the program listing with the counts merged in, one line per word
+   def annotated_listing(self, object):
+      lines = []
+      addresses = set(object.decoded.loadedAddresses())
+      for address in range(0, self.words):
+         if (self.addressCounts[address]):
+            addresses.add(address)
+      for address in sorted(addresses):
+         opcode = object.decoded.opcode[address]
+         line = "Address %4d has opcode %s, operand type %s" % (address, symbols[opcode], "FD"[object.decoded.operandType[address]])
+         if (object.decoded.hasAddress[address]):
+            line = line + ", address %4d" % object.decoded.address[address]
+         else:
+            line = line + ", no address  "
+         line = line + "  executed %8d times" % self.addressCounts[address]
+         if (format(opcode, '05b') in branchOpcodes):
+            line = line + ", branch taken %d times" % self.branchCounts[address]
+         lines.append(line)
+      return lines
@@ -0,0 +1,135 @@
+#
+# Registers and memory as text.
+#
+# The display commands used to print a register one bit per print.  These
+# functions build the text of a register, or of a range of memory, in one
+# pass, one line per register or word, so it can go out in a single write.
+# A value can be shown in any of these views:
+#
+#   bits     - the bits, most significant (bit 0) first
+#   decimal  - the value as a signed integer, or unsigned for the SCR
+#   fraction - the value as the machine's arithmetic sees it, -1 <= x < 1
+#   order    - a word read as an order, e.g. A34F
+#
+# Only the views asked for are worked out.  A StepLogger handed to
+# engine.run() uses the same functions to log every order executed.
+#
+import sys
+from bitutils import getBits
+from codec import symbols
+
+views = ('bits', 'decimal', 'fraction', 'order')
+defaultViews = ('bits',)
+
+# The registers: the array, its size, the name displayed and whether it holds a signed number
+registers = {
+   'acc': ('acc', 'accSize', 'Accumulator', True),
+   'scr': ('scr', 'scrSize', 'Sequence Control Register', False),
+   'ot': ('ot', 'otSize', 'Order Tank Register', True),
+   'multiplier': ('multiplier', 'multiplierSize', 'Multiplier Register', True),
+   'multiplicand': ('multiplicand', 'multiplicandSize', 'Multiplicand Register', True),
+   }
+registerOrder = ('acc', 'scr', 'ot', 'multiplier', 'multiplicand')
+
+# This reads a value of the given size as a two's complement number
+def signed_value(value, size):
+   if (value >> (size - 1)):
+      return value - (1 << size)
+   return value
+
+# This reads a word as an order, using the fields of the machine's geometry
+def order_mnemonic(object, value):
+   geometry = object.geometry
+   def field(first, width):
+      return (value >> (geometry.wordSize - first - width)) & ((1 << width) - 1)
+   opcode = field(*geometry.opcodeField)
+   address = field(*geometry.addressField)
+   operandType = "FD"[field(*geometry.lengthField)]
+   if (address == 0):
+      return symbols[opcode] + operandType
+   return "%s%d%s" % (symbols[opcode], address, operandType)
+
+def view_bits(object, value, size, signed):
+   return format(value, '0%db' % size)
+
+def view_decimal(object, value, size, signed):
+   if (signed):
+      return "%d" % signed_value(value, size)
+   return "%d" % value
+
+def view_fraction(object, value, size, signed):
+   if (not signed):
+      return "-"
+   return "%.10f" % (signed_value(value, size) / float(1 << (size - 1)))
+
+def view_order(object, value, size, signed):
+   if (size != object.wordSize):
+      return "-"
+   return order_mnemonic(object, value)
+
+viewFunctions = {
+   'bits': view_bits,
+   'decimal': view_decimal,
+   'fraction': view_fraction,
+   'order': view_order,
+   }
+
+# This checks the names of the views asked for
+def check_views(names):
+   for name in names:
+      if (name not in viewFunctions):
+         raise ValueError("Unknown view %r, choose from %s" % (name, ", ".join(views)))
+   return names
+
+# This renders a value in each of the views asked for
+def render_value(object, value, size, names=defaultViews, signed=True):
+   return "  ".join(viewFunctions[name](object, value, size, signed) for name in check_views(names))
+
+# This renders one register, e.g. render_register(edsac, 'acc', ('decimal',))
+def render_register(object, name, names=defaultViews):
+   arrayName, sizeName, title, signed = registers[name]
+   size = getattr(object, sizeName)
+   value = getBits(getattr(object, arrayName), 0, size)
+   return "%s: %s" % (title, render_value(object, value, size, names, signed))
+
+# This renders all the registers, one per line
+def render_registers(object, names=defaultViews):
+   return "\n".join(render_register(object, name, names) for name in registerOrder)
+
+# This renders the words of memory from start up to but not including end, one per line
+def render_memory(object, start, end, names=defaultViews):
+   check_views(names)
+   lines = []
+   wordStart = object.geometry.wordStart
+   wordSize = object.wordSize
+   for address in range(start, min(end, object.words)):
+      value = getBits(object.memory, wordStart[address], wordSize)
+      lines.append("Word (%d)- %s" % (address, render_value(object, value, wordSize, names)))
+   return "\n".join(lines)
+
+# This renders the order just executed, from the order tank, and the registers asked for
+def render_step(object, address, orderViews=('order',), registerViews=('decimal',), registerNames=('acc',)):
+   order = render_value(object, getBits(object.ot, 0, object.otSize), object.otSize, orderViews)
+   parts = ["%4d %s" % (address, order)]
+   for name in registerNames:
+      arrayName, sizeName, title, signed = registers[name]
+      size = getattr(object, sizeName)
+      value = getBits(getattr(object, arrayName), 0, size)
+      parts.append("%s %s" % (name, render_value(object, value, size, registerViews, signed)))
+   return "  ".join(parts)
+
+# This logs every order engine.run() executes, one line each, to a file
+class StepLogger():
+   def __init__(self, file=None, orderViews=('order',), registerViews=('decimal',), registerNames=('acc',)):
+      if (file is None):
+         file = sys.stdout
+      self.file = file
+      self.orderViews = check_views(orderViews)
+      self.registerViews = check_views(registerViews)
+      self.registerNames = registerNames
+      for name in registerNames:
+         if (name not in registers):
+            raise ValueError("Unknown register %r" % name)
+
+   def __call__(self, object, address):
+      self.file.write(render_step(object, address, self.orderViews, self.registerViews, self.registerNames) + "\n")
@@ -0,0 +1,234 @@
+#
+# The job server.
+#
+# Starting Python, and a machine, for every tape costs far more than running
+# a small tape.  The server starts a pool of worker processes once, each with
+# a machine already built, and runs the tapes sent to it on them.
+#
+# It listens on a local TCP port or a Unix socket.  A client sends jobs, one
+# JSON object per line:
+#
+#   {"id": 7, "tape": "T56F\nZF\n...", "input": "", "steps": 10000, "starts": 2}
+#
+# The tape is the text of a tape file, or a list of its lines.  The id is
+# handed back with the result, and steps limits the orders executed, up to
+# the limit the server was started with.  That limit also applies to the
+# orders the initial orders execute loading the tape.  Starts is how many
+# times start is pressed, as in the CLI, for programs that stop and wait to
+# be continued.
+# The input tape is checked, but until the I order is implemented nothing
+# reads it.
+#
+# Each result is sent back as soon as its job finishes, one JSON object per
+# line, so results can come back in a different order from the jobs.  Before
+# every job the machine is put back to the state of a new machine, with the
+# Initial Orders in place.
+#
+# Each connection has a queue of limited length for its jobs, counting those
+# running and those whose results have not been sent yet.  While it is full
+# the server stops reading from the connection, so a client sending jobs
+# faster than they run, or not reading its results, is held back by TCP.
+# Jobs are only refused, with a "busy" status, when the jobs of every
+# connection together reach a hard limit.
+#
+# Run it with
+#
+#   python3 server.py [--port N | --unix PATH] [--workers N] [--queue N] [--jobs N] [--steps N]
+#
+import argparse
+import contextlib
+import functools
+import io
+import json
+import queue
+import socket
+import socketserver
+import sys
+import threading
+from multiprocessing import Pool
+import tape
+from codec import encode_symbols
+from engine import getAccValue
+from engine import machine_arrays
+from engine import reset_machine
+from engine import run_starts
+
+defaultPort = 1949
+defaultSteps = 100000
+defaultQueue = 64
+defaultJobs = 4096
+
+# The machine of a worker process, and its state when new
+workerMachine = None
+workerPristine = None
+
+# This builds the machine of a worker process, run once when the process starts
+def start_worker():
+   global workerMachine, workerPristine
+   from edsac import EDSAC
+   workerMachine = EDSAC("server", verbose=False)
+   workerPristine = machine_arrays(workerMachine)
+
+# This runs one job on the worker's machine and returns its result
+def run_job(job, maxSteps):
+   result = {'id': job.get('id'), 'status': 'ok'}
+   try:
+      lines = job.get('tape', "")
+      if (isinstance(lines, str)):
+         lines = lines.splitlines()
+      encode_symbols(job.get('input', ""))
+      steps = job.get('steps', maxSteps)
+      if (not isinstance(steps, int) or steps < 0):
+         raise ValueError("The step limit must be a whole number")
+      steps = min(steps, maxSteps)
+      starts = job.get('starts', 1)
+      if (not isinstance(starts, int) or starts < 1):
+         raise ValueError("The number of starts must be a whole number")
+      reset_machine(workerMachine, workerPristine)
+      with contextlib.redirect_stdout(io.StringIO()):
+         endWord, finished, mode = tape.boot_tape(workerMachine, lines, maxOrders=maxSteps)
+         runResult = run_starts(workerMachine, steps, starts)
+   except Exception as e:
+      result['status'] = 'error'
+      result['error'] = "%s: %s" % (type(e).__name__, e)
+      return result
+   result.update(runResult)
+   result['endWord'] = endWord
+   result['finished'] = finished
+   result['bootMode'] = mode
+   result['accumulator'] = getAccValue(workerMachine)
+   return result
+
+# This handles one connection.  A thread of its own reads the jobs and hands
+# them to the pool, and this thread sends back their results as they finish,
+# so a client that is slow to read only holds up its own connection.
+class JobHandler(socketserver.StreamRequestHandler):
+   def handle(self):
+      server = self.server
+      # The results of this connection waiting to be sent, None once the jobs are all read
+      results = queue.Queue()
+      # Taken for each job read and given back once its result is sent
+      slots = threading.BoundedSemaphore(server.queueSize)
+      # The number of jobs read, each of which gets one result
+      jobCount = [0]
+
+      # These are called by the pool, in its own thread, when a job finishes
+      def done(result):
+         server.jobs.release()
+         results.put(result)
+
+      def failed(jobId, error):
+         done({'id': jobId, 'status': 'error', 'error': "%s: %s" % (type(error).__name__, error)})
+
+      def read_jobs():
+         try:
+            for line in self.rfile:
+               if (not line.strip()):
+                  continue
+               slots.acquire()
+               jobCount[0] += 1
+               try:
+                  job = json.loads(line)
+                  if (not isinstance(job, dict)):
+                     raise ValueError("A job is a JSON object")
+               except ValueError as e:
+                  results.put({'status': 'error', 'error': "ValueError: %s" % e})
+                  continue
+               if (not server.jobs.acquire(blocking=False)):
+                  results.put({'id': job.get('id'), 'status': 'busy'})
+                  continue
+               try:
+                  server.pool.apply_async(run_job, (job, server.maxSteps), callback=done,
+                                          error_callback=functools.partial(failed, job.get('id')))
+               except ValueError as e:
+                  # The pool has been closed, the server is stopping
+                  failed(job.get('id'), e)
+         except OSError:
+            pass
+         results.put(None)
+
+      reader = threading.Thread(target=read_jobs, daemon=True)
+      reader.start()
+      sent = 0
+      allRead = False
+      while (not allRead or sent < jobCount[0]):
+         result = results.get()
+         if (result is None):
+            allRead = True
+            continue
+         try:
+            self.wfile.write((json.dumps(result) + "\n").encode())
+            self.wfile.flush()
+         except OSError:
+            pass
+         sent += 1
+         slots.release()
+      reader.join()
+
+class TCPJobServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+   daemon_threads = True
+   allow_reuse_address = True
+
+if (hasattr(socketserver, "UnixStreamServer")):
+   class UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+      daemon_threads = True
+
+# This starts a server with its pool of workers.  Each connection has up to
+# queueSize jobs running or waiting at once, and jobs past maxJobs across all
+# connections are refused as busy.
+def make_server(port=defaultPort, unixPath=None, workers=None, queueSize=defaultQueue, maxSteps=defaultSteps,
+                maxJobs=defaultJobs):
+   if (unixPath is not None):
+      server = UnixJobServer(unixPath, JobHandler)
+   else:
+      server = TCPJobServer(("127.0.0.1", port), JobHandler)
+   server.pool = Pool(workers, initializer=start_worker)
+   server.queueSize = queueSize
+   server.jobs = threading.BoundedSemaphore(maxJobs)
+   server.maxSteps = maxSteps
+   return server
+
+# This sends jobs to a server and returns their results, in the order they
+# finished.  The jobs are sent from another thread while the results are
+# read, as the server stops reading jobs until results are taken.
+def submit(jobs, port=defaultPort, unixPath=None):
+   if (unixPath is not None):
+      connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      connection.connect(unixPath)
+   else:
+      connection = socket.create_connection(("127.0.0.1", port))
+   with connection:
+      def send_jobs():
+         for job in jobs:
+            connection.sendall((json.dumps(job) + "\n").encode())
+         connection.shutdown(socket.SHUT_WR)
+      sender = threading.Thread(target=send_jobs, daemon=True)
+      sender.start()
+      with connection.makefile("r") as replies:
+         results = [json.loads(line) for line in replies]
+      sender.join()
+      return results
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description="Run tapes sent over a socket on a pool of machines.")
+   parser.add_argument("--port", type=int, default=defaultPort, help="local TCP port to listen on")
+   parser.add_argument("--unix", default=None, help="listen on this Unix socket instead")
+   parser.add_argument("--workers", type=int, default=None, help="worker processes, default one per CPU")
+   parser.add_argument("--queue", type=int, default=defaultQueue, help="most jobs of a connection running or waiting before reading more")
+   parser.add_argument("--jobs", type=int, default=defaultJobs, help="most jobs of all connections before jobs are refused")
+   parser.add_argument("--steps", type=int, default=defaultSteps, help="most orders executed by a job")
+   options = parser.parse_args(argv)
+
+   server = make_server(options.port, options.unix, options.workers, options.queue, options.steps, options.jobs)
+   print("Serving on", options.unix or ("port %d" % options.port))
+   try:
+      server.serve_forever()
+   except KeyboardInterrupt:
+      pass
+   finally:
+      server.server_close()
+      server.pool.terminate()
+   return 0
+
+if __name__ == "__main__":
+   sys.exit(main())
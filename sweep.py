@@ -0,0 +1,114 @@
+#
+# Parameter sweeps.
+#
+# A sweep runs one tape many times, each time with a few words of memory
+# changed: a constant, an entry in a table, an order.  The tape is loaded
+# once, and the memory it leaves is put in a block of shared memory that
+# every worker process reads from.  For each variation a worker restores the
+# image into its own machine, which decodes the words that differ, stores the
+# changed words and runs the program, so no variation loads the tape or sends
+# a machine between processes.
+#
+#   for result in sweep(lines, [{40: 5}, {40: 6}, {40: "A34F"}], workers=4, readWords=[60]):
+#      print(result['index'], result['output'], result['words'])
+#
+# A variation maps addresses to the words to store there, given as numbers
+# or as orders the way they are punched on a tape.  Results are handed back
+# as they finish, each with the index of its variation, so they come back in
+# a different order from the variations.
+#
+import array
+import contextlib
+import io
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+import tape
+from codec import encode_symbols
+from engine import getAccValue
+from engine import machine_arrays
+from engine import reset_machine
+from engine import run_starts
+
+# The state of a worker process: its machine, as new, the shared image, where the tape stopped loading and the settings of the sweep
+sweepMachine = None
+sweepPristine = None
+sweepImage = None
+sweepEnd = None
+sweepSettings = None
+
+# This converts the word of a variation, a number or an order such as A34F, into a 17 bit word
+def patch_word(value):
+   if (isinstance(value, str)):
+      codes = encode_symbols(value)
+      if (len(codes) == 0):
+         raise ValueError("No order in %r" % value)
+      letter, number, digit, terminator, position = tape.read_order(codes, 0)
+      if (terminator is None or position != len(codes)):
+         raise ValueError("%r is not one order" % value)
+      return tape.order_word(letter, number, terminator)
+   return value & tape.wordMask
+
+# This builds the machine of a worker process and attaches it to the shared image
+def start_worker(imageName, endWord, settings):
+   global sweepMachine, sweepPristine, sweepImage, sweepEnd, sweepSettings
+   from edsac import EDSAC
+   sweepMachine = EDSAC("sweep", verbose=False)
+   sweepPristine = machine_arrays(sweepMachine)
+   sweepImage = shared_memory.SharedMemory(name=imageName)
+   sweepEnd = endWord
+   sweepSettings = settings
+
+# This restores the shared image into a machine, as the tape left it
+def load_image(object):
+   memory = array.array(object.memory.typecode)
+   memory.frombytes(sweepImage.buf[:len(object.memory) * object.memory.itemsize])
+   object.restore_memory(memory)
+   object.decoded.markLoaded(tape.programStart, sweepEnd)
+
+# This runs one variation on the worker's machine and returns its result
+def run_variation(job):
+   index, patch = job
+   maxSteps, starts, readWords = sweepSettings
+   object = sweepMachine
+   result = {'index': index, 'status': 'ok'}
+   try:
+      reset_machine(object, sweepPristine)
+      load_image(object)
+      object.programLoaded = True
+      for address, value in dict(patch).items():
+         if (address < 0 or address >= object.words):
+            raise ValueError("Address %d is not in the store" % address)
+         tape.write_word(object, address, patch_word(value))
+      with contextlib.redirect_stdout(io.StringIO()):
+         runResult = run_starts(object, maxSteps, starts)
+   except Exception as e:
+      result['status'] = 'error'
+      result['error'] = "%s: %s" % (type(e).__name__, e)
+      return result
+   result.update(runResult)
+   result['accumulator'] = getAccValue(object)
+   result['words'] = dict((address, tape.read_word(object, address)) for address in readWords)
+   return result
+
+# This runs a tape once for each variation, in worker processes, and yields
+# the results as they finish.  maxSteps and starts limit each run as in the
+# job server, and the words at the readWords addresses are returned with
+# each result.
+def sweep(lines, variations, workers=None, maxSteps=10000, starts=1, readWords=(), chunkSize=16):
+   from edsac import EDSAC
+   if (isinstance(lines, str)):
+      lines = lines.splitlines()
+   base = EDSAC("sweep", verbose=False)
+   endWord, finished, mode = tape.boot_tape(base, lines)
+
+   data = base.memory.tobytes()
+   image = shared_memory.SharedMemory(create=True, size=len(data))
+   try:
+      image.buf[:len(data)] = data
+      settings = (maxSteps, starts, tuple(readWords))
+      with Pool(workers, initializer=start_worker, initargs=(image.name, endWord, settings)) as pool:
+         for result in pool.imap_unordered(run_variation, enumerate(variations), chunkSize):
+            yield result
+   finally:
+      image.close()
+      image.unlink()
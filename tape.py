@@ -1,29 +1,38 @@
 #
 # Programmer - David Whipple
-# 
+#
 # These routines are used to simulate the tape reader.
 # Tape's will be simulated with files.
 #
-# 
+#
 # I am simulating the first version of the Initial Orders 1 devised by David Wheeler
 # Further work to simulate later versions should be done.
-# 
+#
 # In the first version, the initial orders resided in memory locations 0 to 30,
 # and a loaded program tape into locations 31 upwards.
 #
+# A tape can be booted in one of two ways:
+#
+#   faithful    - the initial orders are really executed, reading the tape one
+#                 character at a time with I orders, exactly as the machine did.
+#   accelerated - the standard Initial Orders 1 are recognised in memory and the
+#                 memory image they would have produced is written directly.
+#
+# Both modes leave memory in the same state, including the working locations
+# 0 to 3 and the self-incrementing T order in location 25.  Run this file with
+# a list of tapes (make verify) to check that the two modes agree.
+#
 #
 # Order bit pattern Loc Order Meaning Comment
 #
-from bitutils import makeBitArray
-from bitutils import testBit
-from bitutils import setBit
-from bitutils import clearBit
+import sys
+from codec import encode_symbols
+from codec import symbols
 
-def load_initial_orders(object):
-   initialOrders = {
-#                         OP   
+initialOrders = {
+#                         OP
                      0:'00101 0 0000000000 0',
-                     1:'10101 0 0000000010 0', 
+                     1:'10101 0 0000000010 0',
                      2:'00101 0 0000000000 0',
                      3:'00011 0 0000000110 0',
                      4:'00000 0 0000000001 0',
@@ -48,27 +57,425 @@ def load_initial_orders(object):
                     23:'11001 0 0000000000 1',
                     24:'11100 0 0000000000 0',
                     25:'00101 0 0000011111 0',
-                    26:'11100 0 0000011001 0', 
-                    27:'11100 0 0000000100 0', 
+                    26:'11100 0 0000011001 0',
+                    27:'11100 0 0000000100 0',
                     28:'00111 0 0000011001 0',
                     29:'01100 0 0000011111 0',
-                    30:'11011 0 0000000110 0' 
+                    30:'11011 0 0000000110 0'
                    }
-   print("Loading initial orders in locations 0 to 30.")
 
-   memoryBitLocation = 0
+# The program tape is loaded from this word, which is also where execution starts.
+programStart = 31
+
+# The initial orders execute about a dozen orders for each character read.  A
+# faithful boot that runs for more than this many orders per character, plus
+# a few to start and finish, has been sent round a loop by the tape itself.
+bootOrdersPerCharacter = 20
+bootOrdersSlack = 100
+
+# The initial orders only work on the 17 bit short word, with the fields laid
+# out as on the real machine (geometry.standardWord()).
+orderSize = 17
+wordMask = 0x1FFFF
+
+def load_initial_orders(object):
+   if (object.verbose):
+      print("Loading initial orders in locations 0 to 30.")
+
+   # Each field of an order goes where the machine's geometry puts it
+   geometry = object.geometry
    for orderNumber, order in initialOrders.items():
        #print("Adding order ", order," to memory location ", orderNumber)
-       for bit in order:
-          if (bit != " "):
-             if (bit == "1"):
-                #print("Setting ", memoryBitLocation," to 1")
-                setBit(object.memory, memoryBitLocation)
-             else:
-                #print("Setting ", memoryBitLocation," to 0")
-                clearBit(object.memory, memoryBitLocation)
-#
-             memoryBitLocation = memoryBitLocation + 1
-             #i = raw_input("Press enter to continue.")
+       fields = (geometry.opcodeField, geometry.spareField, geometry.addressField, geometry.lengthField)
+       for field, bits in zip(fields, order.split(" ")):
+          if (field[1] > 0):
+             object.store_bits(orderNumber, field[0], field[1], int(bits, 2) & ((1 << field[1]) - 1))
 
    return
+
+# This converts the lines of a tape file into the 5 bit characters punched on the tape.
+# Lines starting with # are comments, and white space is blank tape.
+def read_tape(lines):
+   return encode_symbols("".join(line for line in lines if not line.startswith("#")))
+
+# These read and write a whole 17 bit word of memory, through the machine.
+def read_word(object, address):
+   return object.read_word(address)
+
+def write_word(object, address, value):
+   object.store_word(address, value & wordMask)
+
+# This converts a 17 bit word into a signed integer.
+def signed_word(value):
+   if (value & 0x10000):
+      return value - 0x20000
+   return value
+
+# This checks memory locations 0 to 30 still hold the standard Initial Orders 1.
+def initial_orders_standard(object):
+   if (not object.geometry.standardWord()):
+      return False
+   for orderNumber, order in initialOrders.items():
+      if (read_word(object, orderNumber) != int(order.replace(" ", ""), 2)):
+         return False
+   return True
+
+# This fetches an operand, scaled as a 35 bit long number.  Long numbers are
+# held in an even location and the one above it, the more significant half above.
+def fetch_operand(object, address, isLong):
+   if (isLong):
+      address = address & ~1
+      value = (read_word(object, address + 1) << 18) | read_word(object, address)
+      if (value & (1 << 34)):
+         value = value - (1 << 35)
+      return value
+   return signed_word(read_word(object, address)) << 18
+
+# This stores the top of the accumulator (71 bits, held in units of 2**-70).
+def store_operand(object, address, isLong, acc):
+   if (isLong):
+      address = address & ~1
+      value = acc >> 36
+      write_word(object, address, value)
+      write_word(object, address + 1, value >> 18)
+   else:
+      write_word(object, address, acc >> 54)
+
+# This keeps the accumulator within its 71 bits.
+def wrap_acc(acc):
+   return ((acc + (1 << 70)) % (1 << 71)) - (1 << 70)
+
+# This runs the initial orders in memory against the tape, one order at a
+# time, until control passes to the loaded program in location 31 or the tape
+# runs out.  Only the orders needed by a loader are provided.
+def boot_faithful(object, codes, maxOrders=None):
+   if (not object.geometry.standardWord()):
+      raise ValueError("The initial orders need 17 bit words laid out as on the real machine")
+   acc = 0
+   multiplier = 0
+   programCounter = 0
+   position = 0
+   executed = 0
+   finished = False
+   while True:
+      if (programCounter == programStart):
+         finished = True
+         break
+      if (maxOrders is not None and executed >= maxOrders):
+         raise RuntimeError("The initial orders did not finish after %d orders" % executed)
+      order = read_word(object, programCounter)
+      opcode = order >> 12
+      address = (order >> 1) & 1023
+      isLong = order & 1
+      programCounter = programCounter + 1
+      executed = executed + 1
+      if (opcode == 28):        # A
+         acc = wrap_acc(acc + (fetch_operand(object, address, isLong) << 36))
+      elif (opcode == 12):      # S
+         acc = wrap_acc(acc - (fetch_operand(object, address, isLong) << 36))
+      elif (opcode == 21):      # H
+         multiplier = fetch_operand(object, address, isLong)
+      elif (opcode == 31):      # V
+         acc = wrap_acc(acc + ((fetch_operand(object, address, isLong) * multiplier) << 2))
+      elif (opcode == 22):      # N
+         acc = wrap_acc(acc - ((fetch_operand(object, address, isLong) * multiplier) << 2))
+      elif (opcode == 30):      # C
+         acc = wrap_acc(acc + ((fetch_operand(object, address, isLong) & multiplier) << 36))
+      elif (opcode == 5):       # T
+         store_operand(object, address, isLong, acc)
+         acc = 0
+      elif (opcode == 7):       # U
+         store_operand(object, address, isLong, acc)
+      elif (opcode == 4 or opcode == 25):   # R and L
+         field = (address << 1) | isLong
+         places = (field & -field).bit_length()
+         if (opcode == 4):
+            acc = acc >> places
+         else:
+            acc = wrap_acc(acc << places)
+      elif (opcode == 3):       # E
+         if (acc >= 0):
+            programCounter = address
+      elif (opcode == 27):      # G
+         if (acc < 0):
+            programCounter = address
+      elif (opcode == 8):       # I
+         if (position == len(codes)):
+            break
+         write_word(object, address, codes[position])
+         position = position + 1
+      elif (opcode == 6):       # Y
+         acc = wrap_acc(acc + (1 << 35))
+      elif (opcode == 26):      # X
+         pass
+      elif (opcode == 13):      # Z
+         break
+      else:
+         raise ValueError("Order %s at location %d can not be run while booting" % (symbols[opcode], programCounter - 1))
+   return (read_word(object, 25) >> 1) & 1023, finished
+
+# This reads the order starting at position in the tape codes: the letter,
+# then the digits of the address up to a character that is not a digit.  It
+# returns the letter, the address, the last digit (None when there were none),
+# the character ending the order (None when the tape ran out first) and the
+# position after the order.
+def read_order(codes, position):
+   letter = codes[position]
+   number = 0
+   digit = None
+   position = position + 1
+   while (position < len(codes)):
+      character = codes[position]
+      position = position + 1
+      if (character >= 10):
+         return letter, number, digit, character, position
+      digit = character
+      number = (10 * number + character) & wordMask
+   return letter, number, digit, None, position
+
+# This is the word the initial orders store for an order read from the tape
+def order_word(letter, number, terminator):
+   return (2 * number + (letter << 12) + ((terminator - 10) >> 3)) & wordMask
+
+# This produces the memory image the standard Initial Orders 1 would leave
+# after reading the tape, without executing them.  It returns None, having
+# changed nothing, when the initial orders are not the standard ones or the
+# tape would make them overwrite themselves.
+def boot_accelerated(object, codes):
+   if (not initial_orders_standard(object)):
+      return None
+   word0 = 0
+   word1 = read_word(object, 1)
+   word2 = read_word(object, 2)
+   word3 = read_word(object, 3)
+   word25 = read_word(object, 25)
+   word31 = read_word(object, programStart)
+   stores = []
+   position = 0
+   finished = False
+   while (position < len(codes)):
+      # The order letter is read first, and ends up in the top 5 bits of word 0,
+      # the address is built up in word 1, and each character read goes through word 2
+      letter, number, digit, terminator, position = read_order(codes, position)
+      word0 = letter << 12
+      word1 = number
+      if (digit is not None):
+         word2 = digit
+         word3 = (digit - 10) & wordMask
+      if (terminator is None):
+         break
+      word2 = terminator
+      address = (word25 >> 1) & 1023
+      if (address < programStart or address >= object.words):
+         return None
+      order = order_word(letter, number, terminator)
+      stores.append((address, order))
+      if (address == programStart):
+         word31 = order
+      # The accumulator overflows just as it does on the machine
+      difference = signed_word((word25 + 2 - word31) & wordMask)
+      word25 = (word25 + 2) & wordMask
+      if (difference >= 0):
+         finished = True
+         break
+      word0 = difference & wordMask
+   for address, order in stores:
+      write_word(object, address, order)
+   write_word(object, 0, word0)
+   write_word(object, 1, word1)
+   write_word(object, 2, word2)
+   write_word(object, 3, word3)
+   write_word(object, 25, word25)
+   return (word25 >> 1) & 1023, finished
+
+# This boots a program tape through the initial orders.  The mode is either
+# "faithful" or "accelerated", and defaults to the mode set on the machine.
+# The accelerated mode falls back to the faithful one when it can not be used.
+# A faithful boot raises RuntimeError after maxOrders orders, by default a
+# limit worked out from the length of the tape.
+def boot_tape(object, lines, mode=None, maxOrders=None):
+   codes = read_tape(lines)
+   if (maxOrders is None):
+      maxOrders = bootOrdersPerCharacter * len(codes) + bootOrdersSlack
+   if (mode is None):
+      mode = object.bootMode
+   if (mode not in ("faithful", "accelerated")):
+      raise ValueError("Unknown boot mode %r" % mode)
+   result = None
+   if (mode == "accelerated"):
+      result = boot_accelerated(object, codes)
+   if (result is None):
+      mode = "faithful"
+      result = boot_faithful(object, codes, maxOrders)
+   endWord, finished = result
+   object.decoded.load(object.memory, programStart, endWord)
+   object.programCounter = programStart
+   object.programLoaded = True
+   # Kept so that an edited tape can be reloaded a line at a time
+   object.tapeSource = list(lines)
+   object.tapeOrders = None
+   if (mode == "accelerated" and finished):
+      object.tapeOrders = line_orders(lines)
+   object.tapeEnd = endWord
+   object.tapeWritten = set()
+   return endWord, finished, mode
+
+# This is a store listener of the machine, it notes the words written since
+# the last tape was loaded, which reload_tape() has to store again
+def note_tape_write(object, start, end, old, new):
+   if (object.tapeWritten is not None):
+      object.tapeWritten.update(range(start, end))
+
+# This reads each line of a tape on its own, returning the order on each line
+# as (letter, address, last digit, terminator), or None for a line with no
+# order.  It returns None when a line holds more or less than a whole order.
+def line_orders(lines):
+   orders = []
+   for line in lines:
+      if (line.startswith("#")):
+         orders.append(None)
+         continue
+      try:
+         codes = encode_symbols(line)
+      except ValueError:
+         return None
+      if (len(codes) == 0):
+         orders.append(None)
+         continue
+      letter, number, digit, terminator, position = read_order(codes, 0)
+      if (terminator is None or position != len(codes)):
+         return None
+      orders.append((letter, number, digit, terminator))
+   return orders
+
+# This loads a tape again after it has been edited.  The lines are compared
+# with the tape loaded last, and only the words of the lines that changed, and
+# any loaded words written to since (see note_tape_write()), are stored and decoded
+# again, along with the working locations the initial orders leave behind.
+# Memory ends up just as loading the whole tape would leave it, which is what
+# is done instead when the tape can not be reloaded a line at a time: it is
+# the first load, the first order or the number of lines changed, a line does
+# not hold exactly one order, or tapes are booted in faithful mode.
+#
+# It returns the end word, whether the initial orders finished, the mode
+# ("incremental" when only changes were stored) and the addresses stored.
+def reload_tape(object, lines, mode=None):
+   if (mode is None):
+      mode = object.bootMode
+   previous = object.tapeSource
+   orders = None
+   if (mode == "accelerated" and object.tapeOrders is not None and len(lines) == len(previous)):
+      orders = list(object.tapeOrders)
+      changedLines = []
+      for index in range(0, len(lines)):
+         if (lines[index] != previous[index]):
+            order = line_orders([lines[index]])
+            if (order is None or (order[0] is None) != (orders[index] is None)):
+               orders = None
+               break
+            if (order[0] != orders[index]):
+               orders[index] = order[0]
+               changedLines.append(index)
+   # The first order says where loading stops, so changing it changes everything
+   if (orders is not None):
+      lineAddresses = {}
+      loaded = []
+      for index in range(0, len(orders)):
+         if (orders[index] is not None):
+            lineAddresses[index] = programStart + len(loaded)
+            loaded.append(orders[index])
+      first = min(lineAddresses)
+      if (orders[first] != object.tapeOrders[first]):
+         orders = None
+   if (orders is None):
+      load_initial_orders(object)
+      endWord, finished, mode = boot_tape(object, lines, mode)
+      return endWord, finished, mode, list(range(0, endWord))
+
+   endWord = object.tapeEnd
+   loaded = loaded[:endWord - programStart]
+   # Words written since the last load, by the program or by hand
+   written = set(object.tapeWritten)
+   stored = set()
+   for index in changedLines:
+      if (lineAddresses[index] < endWord):
+         stored.add(lineAddresses[index])
+   for address in written:
+      if (address < endWord):
+         stored.add(address)
+   load_initial_orders(object)
+   for address in stored:
+      if (address >= programStart):
+         letter, number, digit, terminator = loaded[address - programStart]
+         write_word(object, address, order_word(letter, number, terminator))
+
+   # The working locations hold what the initial orders left there after reading the last order
+   letter, number, digit, terminator = loaded[-1]
+   word3 = read_word(object, 3)
+   for order in reversed(loaded):
+      if (order[2] is not None):
+         word3 = (order[2] - 10) & wordMask
+         break
+   write_word(object, 0, letter << 12)
+   write_word(object, 1, number)
+   write_word(object, 2, terminator)
+   write_word(object, 3, word3)
+   write_word(object, 25, (read_word(object, 25) + 2 * len(loaded)) & wordMask)
+   stored.update(range(0, programStart))
+
+   # The words stored were decoded again as they were stored
+   object.programCounter = programStart
+   object.programLoaded = True
+   object.tapeSource = list(lines)
+   object.tapeOrders = orders
+   object.tapeWritten = set()
+   return endWord, True, "incremental", sorted(stored)
+
+# This boots the same tape in both modes on two fresh machines, and returns
+# the first memory word that differs, or None when the memory is identical.
+def verify_boot_modes(makeMachine, lines):
+   faithfulMachine = makeMachine()
+   boot_tape(faithfulMachine, lines, "faithful")
+   acceleratedMachine = makeMachine()
+   endWord, finished, mode = boot_tape(acceleratedMachine, lines, "accelerated")
+   if (mode != "accelerated"):
+      raise ValueError("The accelerated boot could not be used for this tape")
+   for address in range(0, faithfulMachine.words):
+      if (read_word(faithfulMachine, address) != read_word(acceleratedMachine, address)):
+         return address
+   return None
+
+# Tapes exercising the corners of the initial orders, checked by make verify
+# along with the tapes named on the command line.
+verifyTapes = [
+   [],
+   ["T"],
+   ["T35"],
+   ["T35F", "A"],
+   ["T40F", "A3F", "S1023D", "U25F", "V0D", "ZF"],
+   ["ZF", "A1F", "PD", "T99999F", "GF"],
+   ["A34F", "T31F"],
+   ["T32V", "HF"],
+   ["T33F", "E4F", "OF", "IF"],
+   ["F*"],
+   ["B", "T12", "C4S"],
+   ]
+
+if __name__ == "__main__":
+   from edsac import EDSAC
+   tapes = []
+   for lines in verifyTapes:
+      tapes.append((" ".join(lines), lines))
+   for filename in sys.argv[1:]:
+      with open(filename, "r") as file:
+         tapes.append((filename, file.readlines()))
+   failures = 0
+   for name, lines in tapes:
+      difference = verify_boot_modes(lambda: EDSAC("verify", verbose=False), lines)
+      if (difference is None):
+         print("Boot modes agree for", repr(name))
+      else:
+         print("Boot modes differ at word", difference, "for", repr(name))
+         failures = failures + 1
+   if (failures):
+      sys.exit(1)
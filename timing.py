@@ -0,0 +1,71 @@
+#
+# Machine time.
+#
+# The simulator runs orders as fast as Python allows, which says nothing about
+# how long a program took on the real machine.  The timing model gives every
+# order a cost in microseconds, and engine.run() adds the cost of each order it
+# executes to the machine's simulated time.
+#
+# The costs are the usual published figures: about 1.5 ms for an ordinary
+# order and 6 ms for a multiplication.  Input and output wait for the tape
+# reader and the teleprinter, which managed about 6 2/3 characters a second.
+#
+# A Pacer slows a run down to the speed of the real machine, or a multiple of
+# it.  Rather than waiting after every order it lets a batch of simulated time
+# build up and then sleeps until the wall clock has caught up.
+#
+from time import perf_counter
+from time import sleep
+from codec import symbolCodes
+
+# Cost of an order, in microseconds, when the model does not list it
+orderTime = 1500
+
+# Orders that take longer than the others
+slowOrderTimes = {
+   'V': 6000,       # Multiply and add
+   'N': 6000,       # Multiply and subtract
+   'I': 150000,     # Read a character from the tape
+   'O': 150000,     # Print a character on the teleprinter
+   }
+
+class TimingModel():
+   def __init__(self, orderTimes=None, defaultTime=orderTime):
+      # The cost of every order, keyed by the opcode bits as in engine.opcodeExecution
+      self.orderTimes = {}
+      for code in range(0, 32):
+         self.orderTimes[format(code, '05b')] = defaultTime
+      if (orderTimes is None):
+         orderTimes = slowOrderTimes
+      for letter, time in orderTimes.items():
+         self.orderTimes[format(symbolCodes[letter], '05b')] = time
+
+   def time(self, opcode):
+      return self.orderTimes[opcode]
+
+# This formats a simulated time in microseconds for display
+def format_time(microseconds):
+   return "%d.%06d s" % (microseconds // 1000000, microseconds % 1000000)
+
+class Pacer():
+   def __init__(self, speed=1.0, batchTime=20000):
+      # Multiple of the real machine's speed to run at
+      self.speed = speed
+      # Simulated microseconds to run between sleeps
+      self.batchTime = batchTime
+      self.wallStart = 0.0
+      self.simulatedStart = 0
+
+   # This marks the start of a run, at the given simulated time
+   def start(self, simulatedTime):
+      self.wallStart = perf_counter()
+      self.simulatedStart = simulatedTime
+
+   # This sleeps until the wall clock catches up with the simulated time, and
+   # returns the simulated time at which to pace again
+   def pace(self, simulatedTime):
+      due = (simulatedTime - self.simulatedStart) / 1000000.0 / self.speed
+      ahead = due - (perf_counter() - self.wallStart)
+      if (ahead > 0):
+         sleep(ahead)
+      return simulatedTime + self.batchTime
@@ -0,0 +1,247 @@
+#
+# Execution traces.
+#
+# A TraceWriter handed to engine.run() records every order executed: the
+# program counter, the order word, the accumulator after the order and the
+# memory word written by it, if any.  Records have a fixed width and are
+# packed straight into a block buffer, which is written out (zlib compressed
+# unless asked not to) each time it fills, so a trace of any length is never
+# held in memory.
+#
+# The file is laid out as
+#
+#   header  - magic, flags, record size, records per block, word size and
+#             number of words of the machine traced
+#   blocks  - one after the other
+#   index   - for every block its file offset, stored length and record count
+#   footer  - the offset of the index, and the magic again
+#
+# so a TraceReader can find the block holding any step and decompress just
+# that one.  The fields of a record are as wide as the machine's geometry
+# needs: words of more than 32 bits and stores of 65535 words or more take
+# wider fields.  Two traces are compared block by block to find the first step at
+# which they differ.
+#
+# Run this file to look at traces:
+#
+#   python3 tracefile.py show FILE STEP [COUNT]
+#   python3 tracefile.py compare FILE1 FILE2
+#
+import struct
+import sys
+import zlib
+from geometry import standardGeometry
+
+magic = b'EDSACTR2'
+headerFormat = struct.Struct('<8sBHIBI')
+footerFormat = struct.Struct('<Q8s')
+indexFormat = struct.Struct('<QII')
+
+flagCompressed = 1
+
+# This returns the layout of a record for a store of the given word size and
+# number of words: pc, order word, accumulator (top 7 bits, low 64 bits),
+# address written and word written.  It also returns the address recorded
+# when an order writes nothing, one that is never in the store.
+def record_format(wordSize, words):
+   if (wordSize > 64):
+      raise ValueError("Words of %d bits are too wide to trace" % wordSize)
+   addressCode = 'H'
+   if (words >= 0xFFFF):
+      addressCode = 'I'
+   wordCode = 'I'
+   if (wordSize > 32):
+      wordCode = 'Q'
+   layout = struct.Struct('<%s%sBQ%s%s' % (addressCode, wordCode, addressCode, wordCode))
+   return layout, (1 << (8 * struct.calcsize(addressCode))) - 1
+
+class TraceWriter():
+   def __init__(self, filename, compress=True, blockRecords=4096, geometry=standardGeometry):
+      self.recordFormat, self.noWrite = record_format(geometry.wordSize, geometry.words)
+      self.recordSize = self.recordFormat.size
+      self.file = open(filename, "wb")
+      self.compress = compress
+      self.blockRecords = blockRecords
+      self.block = bytearray(self.recordSize * blockRecords)
+      self.blockCount = 0
+      self.steps = 0
+      self.index = []
+      flags = 0
+      if (compress):
+         flags = flagCompressed
+      self.file.write(headerFormat.pack(magic, flags, self.recordSize, blockRecords, geometry.wordSize, geometry.words))
+
+   # This adds one record, writing the block out when it is full.  The
+   # address written is None when the order wrote nothing.
+   def record(self, pc, order, acc, writeAddress=None, writeValue=0):
+      if (writeAddress is None):
+         writeAddress = self.noWrite
+      self.recordFormat.pack_into(self.block, self.blockCount * self.recordSize, pc, order, acc >> 64, acc & 0xFFFFFFFFFFFFFFFF, writeAddress, writeValue)
+      self.blockCount += 1
+      self.steps += 1
+      if (self.blockCount == self.blockRecords):
+         self.flush()
+
+   def flush(self):
+      if (self.blockCount == 0):
+         return
+      data = memoryview(self.block)[:self.blockCount * self.recordSize]
+      if (self.compress):
+         data = zlib.compress(data)
+      self.index.append((self.file.tell(), len(data), self.blockCount))
+      self.file.write(data)
+      self.blockCount = 0
+
+   # This writes the last block and the index, the trace can not be read before it is closed
+   def close(self):
+      if (self.file is None):
+         return
+      self.flush()
+      indexOffset = self.file.tell()
+      self.file.write(struct.pack('<I', len(self.index)))
+      for entry in self.index:
+         self.file.write(indexFormat.pack(*entry))
+      self.file.write(footerFormat.pack(indexOffset, magic))
+      self.file.close()
+      self.file = None
+
+class TraceReader():
+   def __init__(self, filename):
+      self.file = open(filename, "rb")
+      found, flags, size, self.blockRecords, self.wordSize, self.words = headerFormat.unpack(self.file.read(headerFormat.size))
+      if (found != magic):
+         raise ValueError("%s is not an EDSAC trace" % filename)
+      self.recordFormat, self.noWrite = record_format(self.wordSize, self.words)
+      self.recordSize = self.recordFormat.size
+      if (size != self.recordSize):
+         raise ValueError("%s is not an EDSAC trace" % filename)
+      self.compressed = bool(flags & flagCompressed)
+      self.file.seek(-footerFormat.size, 2)
+      indexOffset, found = footerFormat.unpack(self.file.read(footerFormat.size))
+      if (found != magic):
+         raise ValueError("%s was not closed, it has no index" % filename)
+      self.file.seek(indexOffset)
+      count = struct.unpack('<I', self.file.read(4))[0]
+      # For every block, its offset, stored length, record count and first step
+      self.index = []
+      steps = 0
+      for block in range(0, count):
+         offset, length, records = indexFormat.unpack(self.file.read(indexFormat.size))
+         self.index.append((offset, length, records, steps))
+         steps += records
+      self.steps = steps
+      self.cachedBlock = None
+      self.cachedData = None
+
+   def __len__(self):
+      return self.steps
+
+   def close(self):
+      self.file.close()
+
+   # This returns the stored bytes of a block, as they are in the file
+   def rawBlock(self, block):
+      offset, length, records, firstStep = self.index[block]
+      self.file.seek(offset)
+      return self.file.read(length)
+
+   # This returns the records of a block, decompressed
+   def blockData(self, block):
+      if (block != self.cachedBlock):
+         data = self.rawBlock(block)
+         if (self.compressed):
+            data = zlib.decompress(data)
+         self.cachedBlock = block
+         self.cachedData = data
+      return self.cachedData
+
+   # This returns the record of a step as (pc, order, acc, writeAddress, writeValue),
+   # with writeAddress None when the order wrote nothing
+   def record(self, step):
+      if (step < 0 or step >= self.steps):
+         raise IndexError("Step %d is not in the trace" % step)
+      # Every block but the last is full, so the block can be found directly
+      block = step // self.blockRecords
+      firstStep = self.index[block][3]
+      pc, order, accHigh, accLow, writeAddress, writeValue = self.recordFormat.unpack_from(self.blockData(block), (step - firstStep) * self.recordSize)
+      if (writeAddress == self.noWrite):
+         writeAddress = None
+      return pc, order, (accHigh << 64) | accLow, writeAddress, writeValue
+
+   # This iterates over the records from a step onwards
+   def records(self, start=0):
+      for step in range(start, self.steps):
+         yield self.record(step)
+
+# This returns the first step at which two traces differ, or None when they are the same
+def first_divergence(filename1, filename2):
+   trace1 = TraceReader(filename1)
+   trace2 = TraceReader(filename2)
+   try:
+      if (trace1.recordSize != trace2.recordSize or trace1.wordSize != trace2.wordSize):
+         raise ValueError("The traces are of machines with different words")
+      recordSize = trace1.recordSize
+      sameLayout = (trace1.blockRecords == trace2.blockRecords and trace1.compressed == trace2.compressed)
+      steps = min(trace1.steps, trace2.steps)
+      step = 0
+      while (step < steps):
+         block1 = step // trace1.blockRecords
+         block2 = step // trace2.blockRecords
+         records = min(trace1.index[block1][2] + trace1.index[block1][3], trace2.index[block2][2] + trace2.index[block2][3]) - step
+         # Identical stored blocks hold identical records, no need to decompress them
+         if (sameLayout and trace1.index[block1][2] == trace2.index[block2][2] and trace1.rawBlock(block1) == trace2.rawBlock(block2)):
+            step += records
+            continue
+         start1 = (step - trace1.index[block1][3]) * recordSize
+         start2 = (step - trace2.index[block2][3]) * recordSize
+         data1 = trace1.blockData(block1)
+         data2 = trace2.blockData(block2)
+         if (data1[start1:start1 + records * recordSize] != data2[start2:start2 + records * recordSize]):
+            for record in range(0, records):
+               offset = record * recordSize
+               if (data1[start1 + offset:start1 + offset + recordSize] != data2[start2 + offset:start2 + offset + recordSize]):
+                  return step + record
+         step += records
+      if (trace1.steps != trace2.steps):
+         return steps
+      return None
+   finally:
+      trace1.close()
+      trace2.close()
+
+# This formats a record for display, the words shown with wordSize bits
+def format_record(step, record, wordSize=17):
+   pc, order, acc, writeAddress, writeValue = record
+   wordFormat = '0%db' % wordSize
+   line = "%10d  pc %4d  order %s  acc %018x" % (step, pc, format(order, wordFormat), acc)
+   if (writeAddress is not None):
+      line = line + "  word %4d = %s" % (writeAddress, format(writeValue, wordFormat))
+   return line
+
+if __name__ == "__main__":
+   if (len(sys.argv) >= 4 and sys.argv[1] == "show"):
+      reader = TraceReader(sys.argv[2])
+      step = int(sys.argv[3])
+      count = 1
+      if (len(sys.argv) > 4):
+         count = int(sys.argv[4])
+      for current in range(step, min(step + count, len(reader))):
+         print(format_record(current, reader.record(current), reader.wordSize))
+      reader.close()
+   elif (len(sys.argv) == 4 and sys.argv[1] == "compare"):
+      step = first_divergence(sys.argv[2], sys.argv[3])
+      if (step is None):
+         print("The traces are the same.")
+      else:
+         print("The traces first differ at step", step)
+         for filename in sys.argv[2:4]:
+            reader = TraceReader(filename)
+            if (step < len(reader)):
+               print(filename, format_record(step, reader.record(step), reader.wordSize))
+            else:
+               print(filename, "ends before step", step)
+            reader.close()
+         sys.exit(1)
+   else:
+      print("Usage: tracefile.py show FILE STEP [COUNT] | tracefile.py compare FILE1 FILE2")
+      sys.exit(2)